@@ -0,0 +1,346 @@
+import itertools
+import math
+import random
+import threading
+from collections import namedtuple
+
+import recorder
+
+PriceVolume = namedtuple('PriceVolume', ['price', 'volume'])
+PriceBook = namedtuple('PriceBook', ['instrument_id', 'timestamp', 'bids', 'asks'])
+OrderStatus = namedtuple('OrderStatus', ['order_id', 'instrument_id', 'price', 'volume', 'side'])
+InsertOrderResponse = namedtuple('InsertOrderResponse', ['success', 'order_id'])
+Trade = namedtuple('Trade', ['order_id', 'instrument_id', 'price', 'volume', 'side'])
+
+# One market data update: the full external book of one instrument at a point in time.
+# bids and asks are lists of (price, volume), best level first.
+Snapshot = namedtuple('Snapshot', ['timestamp', 'instrument_id', 'bids', 'asks'])
+
+BacktestResult = namedtuple('BacktestResult', ['pnl', 'positions', 'trade_count', 'traded_volume', 'submitted_volume',
+                                               'message_count', 'steps', 'max_abs_position', 'mean_abs_position'])
+
+
+class SimulatedExchange:
+    """
+    Local stand-in for optibook.synchronous_client.Exchange.
+
+    Replays recorded or synthetic book snapshots as the external market and
+    matches our orders against it with price-time priority. Time only moves
+    when step() is called, so a replay runs as fast as the strategy can
+    process it rather than in real time.
+
+    Our aggressive orders trade against the external levels at their prices.
+    Our resting orders are shown in the book next to the external liquidity
+    and fill at their own price, in price-time order, once a later snapshot
+    trades through them.
+    """
+
+    def __init__(self, feed, position_limit=100):
+        self.feed = iter(sorted(feed, key=lambda snapshot: snapshot.timestamp))
+        self.position_limit = position_limit
+        self.timestamp = 0.0
+        self._pending = next(self.feed, None)
+
+        self._external = {}
+        self._orders = {}
+        self._order_ids = itertools.count(1)
+        self._seq = itertools.count()
+        self._new_trades = {}
+        self.positions = {}
+        self.cash = 0.0
+        self.trade_count = 0
+        self.traded_volume = 0
+        self.submitted_volume = 0
+        self.message_count = 0
+        self._lock = threading.RLock()
+
+    def connect(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def clock(self):
+        return self.timestamp
+
+    def step(self):
+        """
+        Apply all snapshots sharing the next timestamp, then fill any resting orders they trade through.
+
+        Returns:
+            False once the feed is exhausted, True otherwise.
+        """
+        if self._pending is None:
+            return False
+        with self._lock:
+            self.timestamp = self._pending.timestamp
+            updated = set()
+            while self._pending is not None and self._pending.timestamp == self.timestamp:
+                snapshot = self._pending
+                self._external[snapshot.instrument_id] = ([list(level) for level in snapshot.bids], [list(level) for level in snapshot.asks])
+                self.positions.setdefault(snapshot.instrument_id, 0)
+                updated.add(snapshot.instrument_id)
+                self._pending = next(self.feed, None)
+            for instrument_id in updated:
+                self._match_resting(instrument_id)
+        return True
+
+    ######## optibook Exchange method surface ########
+
+    def insert_order(self, instrument_id, *, price, volume, side, order_type='limit'):
+        with self._lock:
+            self.message_count += 1
+            position = self.positions.get(instrument_id, 0)
+            if side == 'bid' and position + volume > self.position_limit:
+                return InsertOrderResponse(False, None)
+            elif side == 'ask' and position - volume < -self.position_limit:
+                return InsertOrderResponse(False, None)
+
+            order_id = next(self._order_ids)
+            self.submitted_volume += volume
+            remaining = self._match_aggressive(instrument_id, order_id, price, volume, side)
+            if remaining > 0 and order_type == 'limit':
+                self._orders[order_id] = [order_id, instrument_id, price, remaining, side, next(self._seq)]
+            return InsertOrderResponse(True, order_id)
+
+    def amend_order(self, instrument_id, *, order_id, volume):
+        with self._lock:
+            self.message_count += 1
+            order = self._orders.get(order_id)
+            if order is None or order[1] != instrument_id:
+                return False
+            if volume <= 0:
+                del self._orders[order_id]
+            elif volume > order[3]:
+                # Increasing volume loses queue priority
+                order[3] = volume
+                order[5] = next(self._seq)
+            else:
+                order[3] = volume
+            return True
+
+    def delete_order(self, instrument_id, *, order_id):
+        with self._lock:
+            self.message_count += 1
+            order = self._orders.get(order_id)
+            if order is None or order[1] != instrument_id:
+                return False
+            del self._orders[order_id]
+            return True
+
+    def delete_orders(self, instrument_id):
+        with self._lock:
+            self.message_count += 1
+            for order_id in [order_id for order_id, order in self._orders.items() if order[1] == instrument_id]:
+                del self._orders[order_id]
+
+    def get_outstanding_orders(self, instrument_id):
+        with self._lock:
+            return {order[0]: OrderStatus(order[0], order[1], order[2], order[3], order[4])
+                    for order in self._orders.values() if order[1] == instrument_id}
+
+    def get_last_price_book(self, instrument_id):
+        with self._lock:
+            if instrument_id not in self._external:
+                return None
+            ext_bids, ext_asks = self._external[instrument_id]
+            bids = {}
+            asks = {}
+            for price, volume in ext_bids:
+                bids[price] = bids.get(price, 0) + volume
+            for price, volume in ext_asks:
+                asks[price] = asks.get(price, 0) + volume
+            for order in self._orders.values():
+                if order[1] == instrument_id:
+                    levels = bids if order[4] == 'bid' else asks
+                    levels[order[2]] = levels.get(order[2], 0) + order[3]
+            return PriceBook(
+                instrument_id,
+                self.timestamp,
+                [PriceVolume(price, bids[price]) for price in sorted(bids, reverse=True) if bids[price] > 0],
+                [PriceVolume(price, asks[price]) for price in sorted(asks) if asks[price] > 0])
+
+    def poll_new_trades(self, instrument_id):
+        with self._lock:
+            return self._new_trades.pop(instrument_id, [])
+
+    def get_positions(self):
+        with self._lock:
+            return dict(self.positions)
+
+    def get_pnl(self):
+        with self._lock:
+            pnl = self.cash
+            for instrument_id, position in self.positions.items():
+                mid = self._mid(instrument_id)
+                if position and mid is not None:
+                    pnl += position * mid
+            return pnl
+
+    ######## matching ########
+
+    def _match_aggressive(self, instrument_id, order_id, price, volume, side):
+        ext_bids, ext_asks = self._external.get(instrument_id, ([], []))
+        levels = ext_asks if side == 'bid' else ext_bids
+        while volume > 0 and levels:
+            level_price, level_volume = levels[0]
+            if (side == 'bid' and level_price > price) or (side == 'ask' and level_price < price):
+                break
+            traded = min(volume, level_volume)
+            self._fill(instrument_id, order_id, level_price, traded, side)
+            volume -= traded
+            if traded == level_volume:
+                levels.pop(0)
+            else:
+                levels[0][1] -= traded
+        return volume
+
+    def _match_resting(self, instrument_id):
+        ext_bids, ext_asks = self._external[instrument_id]
+        resting = sorted((order for order in self._orders.values() if order[1] == instrument_id),
+                         key=lambda order: (-order[2] if order[4] == 'bid' else order[2], order[5]))
+        for order in resting:
+            levels = ext_asks if order[4] == 'bid' else ext_bids
+            while order[3] > 0 and levels:
+                level_price, level_volume = levels[0]
+                if (order[4] == 'bid' and level_price > order[2]) or (order[4] == 'ask' and level_price < order[2]):
+                    break
+                traded = min(order[3], level_volume)
+                self._fill(instrument_id, order[0], order[2], traded, order[4])
+                order[3] -= traded
+                if traded == level_volume:
+                    levels.pop(0)
+                else:
+                    levels[0][1] -= traded
+            if order[3] == 0:
+                del self._orders[order[0]]
+
+    def _fill(self, instrument_id, order_id, price, volume, side):
+        if side == 'bid':
+            self.positions[instrument_id] = self.positions.get(instrument_id, 0) + volume
+            self.cash -= price * volume
+        else:
+            self.positions[instrument_id] = self.positions.get(instrument_id, 0) - volume
+            self.cash += price * volume
+        self.trade_count += 1
+        self.traded_volume += volume
+        self._new_trades.setdefault(instrument_id, []).append(Trade(order_id, instrument_id, price, volume, side))
+
+    def _mid(self, instrument_id):
+        ext_bids, ext_asks = self._external.get(instrument_id, ([], []))
+        if not (ext_bids and ext_asks):
+            return None
+        return (ext_bids[0][0] + ext_asks[0][0]) / 2
+
+
+def synthetic_dual_listing_feed(stock_pair_list, n_steps, start_price=100.0, tick=0.1, volume=50, seed=0):
+    """
+    Random-walk books for dual listed pairs whose two listings occasionally drift apart.
+
+    Returns:
+        List of Snapshots, one per instrument per step.
+    """
+    rng = random.Random(seed)
+    mids = {pair: start_price for pair in stock_pair_list}
+    feed = []
+    for step in range(n_steps):
+        for stock_id, stock_id_dual in stock_pair_list:
+            mids[(stock_id, stock_id_dual)] += rng.choice((-tick, 0, tick))
+            mid = mids[(stock_id, stock_id_dual)]
+            for instrument_id in (stock_id, stock_id_dual):
+                instrument_mid = mid + rng.choice((-2, -1, 0, 0, 0, 1, 2)) * tick
+                feed.append(_snapshot(step, instrument_id, instrument_mid, tick, volume, rng))
+    return feed
+
+
+def synthetic_etf_futures_feed(etf_id, fut_id, n_steps, start_price=400.0, tick=0.1, volume=50, seed=0,
+                               ratio=0.25, offset=2.5, discount_factor=0.9988):
+    """
+    Random-walk futures book with an ETF book noisily tracking its fair value.
+
+    Returns:
+        List of Snapshots, one per instrument per step.
+    """
+    rng = random.Random(seed)
+    fut_mid = start_price
+    feed = []
+    for step in range(n_steps):
+        fut_mid += rng.choice((-tick, 0, tick))
+        etf_mid = fut_mid * discount_factor * ratio + offset + rng.choice((-2, -1, 0, 0, 0, 1, 2)) * tick
+        feed.append(_snapshot(step, fut_id, fut_mid, tick, volume, rng))
+        feed.append(_snapshot(step, etf_id, etf_mid, tick, volume, rng))
+    return feed
+
+
+def load_feed(directory):
+    """
+    Build a replay feed from a directory written by recorder.MarketDataRecorder.
+
+    Only the top of book is recorded, so every snapshot holds a single level per side.
+
+    Returns:
+        List of Snapshots.
+    """
+    instruments = recorder.load_instruments(directory)
+    records = recorder.load_top_of_book(directory)
+    feed = []
+    for timestamp, instrument, bid_price, bid_volume, ask_price, ask_volume in records.tolist():
+        bids = [] if math.isnan(bid_price) else [(bid_price, int(bid_volume))]
+        asks = [] if math.isnan(ask_price) else [(ask_price, int(ask_volume))]
+        feed.append(Snapshot(timestamp, instruments[instrument], bids, asks))
+    return feed
+
+
+def _snapshot(timestamp, instrument_id, mid, tick, volume, rng, depth=5):
+    best_bid = round(mid - tick, 2)
+    best_ask = round(mid + tick, 2)
+    bids = [(round(best_bid - i * tick, 2), rng.randint(1, volume)) for i in range(depth)]
+    asks = [(round(best_ask + i * tick, 2), rng.randint(1, volume)) for i in range(depth)]
+    return Snapshot(float(timestamp), instrument_id, bids, asks)
+
+
+def run_backtest(trader, exchange):
+    """
+    Drive a trader through the exchange's whole feed.
+
+    The trader must have been created with this SimulatedExchange. Instead of
+    blocking in wait_for_update(), the market data engine is polled once per
+    replay step and the trader only iterates when its books changed. The
+    trader's logging stays silent unless event_log.setup_logging() was called.
+
+    Args:
+        trader: A DualListingTrader or EtfFuturesTrader.
+        exchange: The SimulatedExchange holding the feed.
+
+    Returns:
+        BacktestResult with the final PnL, positions and activity counts, and the largest and average
+        absolute position per instrument over all steps.
+    """
+    trader.clock = exchange.clock
+    steps = 0
+    max_abs_position = {}
+    total_abs_position = {}
+    while exchange.step():
+        steps += 1
+        changed_instruments = trader.market_data.poll()
+        if changed_instruments:
+            trader.trade_iteration(set(changed_instruments))
+        for instrument_id, position in exchange.positions.items():
+            max_abs_position[instrument_id] = max(max_abs_position.get(instrument_id, 0), abs(position))
+            total_abs_position[instrument_id] = total_abs_position.get(instrument_id, 0) + abs(position)
+    trader.gateway.shutdown()
+    mean_abs_position = {instrument_id: total / steps for instrument_id, total in total_abs_position.items()}
+    return BacktestResult(exchange.get_pnl(), exchange.get_positions(), exchange.trade_count, exchange.traded_volume,
+                          exchange.submitted_volume, exchange.message_count, steps, max_abs_position, mean_abs_position)
+
+
+if __name__ == '__main__':
+    from dual_listing_algo import DualListingTrader, stock_pair_list
+    from etf_futures_algo import EtfFuturesTrader
+    from position_state import PositionState
+
+    exchange = SimulatedExchange(synthetic_dual_listing_feed(stock_pair_list, n_steps=2000))
+    print(f'Dual listing: {run_backtest(DualListingTrader(exchange, PositionState(exchange)), exchange)}')
+
+    exchange = SimulatedExchange(synthetic_etf_futures_feed('OB5X_ETF', 'OB5X_202509_F', n_steps=2000))
+    print(f'ETF futures: {run_backtest(EtfFuturesTrader(exchange, PositionState(exchange)), exchange)}')
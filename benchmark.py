@@ -0,0 +1,217 @@
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+from backtest import SimulatedExchange, synthetic_dual_listing_feed, synthetic_etf_futures_feed
+from dual_listing_algo import DualListingTrader, stock_pair_list
+from etf_futures_algo import EtfFuturesTrader
+from instrumentation import Instrumentation, InstrumentedExchange
+from position_state import PositionState
+
+# Metrics compared against a baseline, and whether a higher value is better
+COMPARED_METRICS = {
+    'decisions_per_sec': True,
+    'exchange_calls_per_decision': False,
+    'alloc_bytes_per_decision': False,
+    'decision_p99_ms': False,
+    'tick_to_order_p50_ms': False,
+    'tick_to_order_p99_ms': False,
+}
+# Smallest change of the median flagged as worse, in percent
+MIN_FLAGGED_CHANGE = 5.0
+
+
+class DelayedExchange:
+    """
+    Wraps an exchange so every method call takes a fixed simulated round-trip time.
+    """
+
+    def __init__(self, exchange, round_trip):
+        self._exchange = exchange
+        self._round_trip = round_trip
+
+    def __getattr__(self, name):
+        attr = getattr(self._exchange, name)
+        if not callable(attr) or self._round_trip <= 0:
+            return attr
+
+        def delayed(*args, **kwargs):
+            time.sleep(self._round_trip)
+            return attr(*args, **kwargs)
+
+        return delayed
+
+
+def benchmark_feeds(n_steps, seed=0):
+    return {
+        'dual_listing': (DualListingTrader, synthetic_dual_listing_feed(stock_pair_list, n_steps=n_steps, seed=seed)),
+        'etf_futures': (EtfFuturesTrader, synthetic_etf_futures_feed('OB5X_ETF', 'OB5X_202509_F', n_steps=n_steps, seed=seed)),
+    }
+
+
+def replay(trader_type, feed, round_trip=0.0, trace_allocations=False):
+    """
+    Replay a feed through a freshly created trader, timing every decision: polling the books and, when any of
+    them changed, the trade loop iteration. The exchange calls counted per decision are the ones timed.
+
+    Returns:
+        Tuple (decision latencies in seconds, allocated bytes per decision or None, Instrumentation holding
+        the exchange call and tick-to-order stages, the trader's stage prefix).
+    """
+    exchange = SimulatedExchange(feed)
+    instrumentation = Instrumentation(window=len(feed))
+    client = InstrumentedExchange(DelayedExchange(exchange, round_trip), instrumentation)
+    trader = trader_type(client, PositionState(client), instrumentation=instrumentation)
+    trader.clock = exchange.clock
+
+    decision_latencies = []
+    allocations = [] if trace_allocations else None
+    if trace_allocations:
+        tracemalloc.start()
+    try:
+        while exchange.step():
+            if trace_allocations:
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            changed_instruments = trader.market_data.poll()
+            if changed_instruments:
+                trader.trade_iteration(set(changed_instruments))
+            decision_latencies.append(time.perf_counter() - start)
+            if trace_allocations:
+                allocations.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        if trace_allocations:
+            tracemalloc.stop()
+        trader.gateway.shutdown()
+    return np.array(decision_latencies), allocations, instrumentation, trader.stage_prefix
+
+
+def timing_metrics(decision_latencies, instrumentation, stage_prefix):
+    report = instrumentation.report()
+    decisions = len(decision_latencies)
+    tick_to_order = report.get(stage_prefix + 'tick_to_order', {})
+    p50, p99 = np.percentile(decision_latencies, [50, 99]) if decisions else (0.0, 0.0)
+    return {
+        'decisions_per_sec': decisions / decision_latencies.sum() if decisions else 0.0,
+        'decision_p50_ms': p50 * 1000,
+        'decision_p99_ms': p99 * 1000,
+        'tick_to_order_p50_ms': tick_to_order.get('p50_ms', 0.0),
+        'tick_to_order_p99_ms': tick_to_order.get('p99_ms', 0.0),
+        'tick_to_order_max_ms': tick_to_order.get('max_ms', 0.0),
+    }
+
+
+def run_benchmark(trader_type, feed, round_trip=0.0, repeats=5):
+    """
+    Benchmark one strategy over a feed.
+
+    Wall-clock timings of a single replay are noisy, so the feed is replayed
+    repeats times and the median of each timing metric is reported, with its
+    range across the repeats. The exchange calls are the same in every
+    replay. The feed is then replayed once more under tracemalloc for the
+    peak bytes allocated during each decision, since tracing slows the loop
+    down too much to time it at the same time.
+
+    Returns:
+        Dict of metrics.
+    """
+    runs = []
+    for _ in range(repeats):
+        decision_latencies, _, instrumentation, stage_prefix = replay(trader_type, feed, round_trip)
+        runs.append(timing_metrics(decision_latencies, instrumentation, stage_prefix))
+    _, allocations, _, _ = replay(trader_type, feed, round_trip, trace_allocations=True)
+
+    # Call counts and stage breakdown from the last replay
+    report = instrumentation.report()
+    decisions = len(decision_latencies)
+    exchange_calls = {stage[len('exchange.'):]: summary['count'] for stage, summary in report.items() if stage.startswith('exchange.')}
+    metrics = {metric: float(np.median([run[metric] for run in runs])) for metric in runs[0]}
+    return {
+        'decisions': decisions,
+        **metrics,
+        # [min, max] of each timing metric across the repeats
+        'ranges': {metric: [min(run[metric] for run in runs), max(run[metric] for run in runs)] for metric in runs[0]},
+        'exchange_calls': exchange_calls,
+        'exchange_calls_per_decision': sum(exchange_calls.values()) / decisions if decisions else 0.0,
+        'alloc_bytes_per_decision': float(np.mean(allocations)) if allocations else 0.0,
+        'alloc_bytes_p99': float(np.percentile(allocations, 99)) if allocations else 0.0,
+        'tick_to_order_count': report.get(stage_prefix + 'tick_to_order', {}).get('count', 0),
+        'stages': {stage: summary for stage, summary in report.items() if not stage.startswith('exchange.')},
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(results, baseline):
+    """
+    Print the relative change of each compared metric against a baseline results file.
+
+    A change is flagged as worse when the median moved by at least
+    MIN_FLAGGED_CHANGE and, for timings, every repeat of this run is worse
+    than every repeat of the baseline, so machine noise alone rarely flags.
+    """
+    if results['config'] != baseline['config']:
+        print(f'''Warning: comparing against a run with a different config {baseline['config']}''')
+    for strategy, metrics in results['strategies'].items():
+        if strategy not in baseline['strategies']:
+            continue
+        print(f'{strategy}:')
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = baseline['strategies'][strategy][metric], metrics[metric]
+            change = (new - old) / old * 100 if old else 0.0
+            old_low, old_high = baseline['strategies'][strategy].get('ranges', {}).get(metric, (old, old))
+            new_low, new_high = metrics['ranges'].get(metric, (new, new))
+            if higher_is_better:
+                worse = change <= -MIN_FLAGGED_CHANGE and new_high < old_low
+            else:
+                worse = change >= MIN_FLAGGED_CHANGE and new_low > old_high
+            print(f'''  {metric:28s} {old:12.3f} -> {new:12.3f} {change:+7.1f}%{'  (worse)' if worse else ''}''')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the decision loop of both strategies on a deterministic simulated exchange.')
+    parser.add_argument('--steps', type=int, default=1000, help='Number of synthetic book updates per strategy')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--round-trip-ms', type=float, default=0.0, help='Simulated latency of every exchange call')
+    parser.add_argument('--repeats', type=int, default=5, help='Timed replays per strategy, the median of each timing is reported')
+    parser.add_argument('--output', default='benchmark.json', help='Where to save the results as JSON')
+    parser.add_argument('--compare', help='Results JSON of an earlier run to compare against')
+    args = parser.parse_args()
+    # Keep position reduction warnings out of the output, and their cost out of the measurements
+    logging.getLogger('trading').setLevel('ERROR')
+
+    results = {
+        'environment': environment(),
+        'config': {'steps': args.steps, 'seed': args.seed, 'round_trip_ms': args.round_trip_ms, 'repeats': args.repeats},
+        'strategies': {},
+    }
+    for strategy, (trader_type, feed) in benchmark_feeds(args.steps, args.seed).items():
+        metrics = run_benchmark(trader_type, feed, args.round_trip_ms / 1000, args.repeats)
+        results['strategies'][strategy] = metrics
+        print(f'''{strategy}: {metrics['decisions_per_sec']:.0f} decisions/s, {metrics['exchange_calls_per_decision']:.2f} exchange calls/decision, '''
+              f'''{metrics['alloc_bytes_per_decision']:.0f} bytes allocated/decision, tick-to-order p50 {metrics['tick_to_order_p50_ms']:.3f} ms '''
+              f'''p99 {metrics['tick_to_order_p99_ms']:.3f} ms''')
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
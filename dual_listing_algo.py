@@ -1,226 +1,235 @@
-import datetime as dt
 import time
 import random
 import logging
+from collections import namedtuple
 
-from optibook.synchronous_client import Exchange
 import numpy as np
 
-exchange = Exchange()
-exchange.connect()
+from event_log import setup_logging
+from instrumentation import Instrumentation, InstrumentedExchange
+from inventory import InventoryManager
+from market_data import MarketDataEngine
+from order_gateway import Leg, OrderGateway
+from own_orders import OrderRegistry
+from quote_manager import QuoteManager
+from recorder import MarketDataRecorder
+from risk import RiskEngine
+from signals import BID, STRAT_ACTIVE, STRAT_NONE, dual_listing_signals, leg_volume
+from position_state import PositionState
 
-logging.getLogger('client').setLevel('ERROR')
+logger = logging.getLogger('trading.dual_listing')
 
 
-def trade_would_breach_position_limit(instrument_id, volume, side, breach, position_limit=100):
-    positions = exchange.get_positions()
-    position_instrument = positions[instrument_id]
-
-    if breach == False:
-        return False
-    elif side == 'bid':
-        return position_instrument + volume > position_limit
-    elif side == 'ask':
-        return position_instrument - volume < -position_limit
-    else:
-        raise Exception(f'''Invalid side provided: {side}, expecting 'bid' or 'ask'.''')
-
-def amt_to_reduce_position(instrument_id, volume, side, position_limit=100):
-    positions = exchange.get_positions()
-    position_instrument = positions[instrument_id]
-
-    if side == 'bid':
-        return 'ask', (position_instrument + volume) - position_limit
-    elif side == 'ask':
-        return 'bid', (-position_limit) - (position_instrument - volume)
-
-def print_positions_and_pnl(always_display=None):
-    positions = exchange.get_positions()
-    print('Positions:')
-    for instrument_id in positions:
-        if not always_display or instrument_id in always_display or positions[instrument_id] != 0:
-            print(f'  {instrument_id:20s}: {positions[instrument_id]:4.0f}')
-
-    pnl = exchange.get_pnl()
-    if pnl:
-        print(f'\nPnL: {pnl:.2f}')
-
-def is_self_trade(instrument_id, side, price):
+def is_self_trade(own_orders, instrument_id, side, price):
     """
     Check if placing a limit order at this price would result in a self-trade.
 
     Args:
-        exchange: The optibook exchange object.
+        own_orders: The OrderRegistry of our resting orders.
         instrument_id: The instrument you're trading.
-        side: 'buy' or 'sell' for the incoming order.
+        side: 'bid' or 'ask' for the incoming order.
         price: Price of the order you're about to place.
 
     Returns:
         True if placing this order could result in a self-trade, False otherwise.
     """
-    outstanding_orders = list(exchange.get_outstanding_orders(instrument_id).values())
+    return own_orders.is_self_trade(instrument_id, side, price)
 
-    # Finding opposite orders
-    my_opposite_orders = [o for o in outstanding_orders if o.side != side]
+stock_pair_list = [('ASML', 'ASML_DUAL'), ('SAP', 'SAP_DUAL')]
 
-    # Check if the incoming price would match with any of my opposite orders
-    if side == 'bid':
-        # Buying at a price >= my own sell (ask)
-        for order in my_opposite_orders:
-            if (order.side == 'ask' and price >= order.price):
-                return True
-    elif side == 'ask':
-        # Selling at a price <= my own buy (bid)
-        for order in my_opposite_orders:
-            if (order.side == 'bid' and price <= order.price):
-                return True
+# Tunable strategy parameters, see sweep.py for evaluating grids of them offline.
+# A leg trades the base volume, plus the extra volume when it does not add to an existing position.
+# pair_limit caps the absolute net position across the two listings of a stock.
+DualListingParams = namedtuple('DualListingParams', ['active_base_volume', 'active_extra_volume', 'passive_base_volume',
+                                                     'passive_extra_volume', 'price_improvement', 'reduce_threshold',
+                                                     'pair_limit', 'unwind_target', 'max_unwind_cost',
+                                                     'passive_requote_interval'],
+                               defaults=(4, 26, 4, 16, 0.01, 94, 40, 84, 0.0, 2.5))
 
-    return False
 
-stock_pair_list = [('ASML', 'ASML_DUAL'), ('SAP', 'SAP_DUAL')]
-stock_list = [stock for pair in stock_pair_list for stock in pair]
-
-while True:
-    print(f'')
-    print(f'-----------------------------------------------------------------')
-    print(f'TRADE LOOP ITERATION ENTERED AT {str(dt.datetime.now()):18s} UTC.')
-    print(f'-----------------------------------------------------------------')
-
-    positions = exchange.get_positions()
-    print_positions_and_pnl(always_display=[stock for pair in stock_pair_list for stock in pair])
-    print(f'')
-
-    stock_id_breach = "NIL"
-    stock_id_dual_breach = "NIL"
-
-    ### Check for near-limit positions & reduce those positions
-    for instrument_id in positions:
-        if (positions[instrument_id] >= 94 and exchange.get_last_price_book(instrument_id).bids):
-            print(f'Reducing position in {instrument_id} as about to breach position limit.')
-            exchange.insert_order(instrument_id, price=exchange.get_last_price_book(instrument_id).bids[0].price, volume=10, side='ask', order_type='ioc')
-            #if instrument_id in stock_list:
-            #    stock_list.remove(instrument_id)
-        elif (positions[instrument_id] <= -94 and exchange.get_last_price_book(instrument_id).asks):
-            print(f'Reducing position in {instrument_id} as about to breach position limit.')
-            exchange.insert_order(instrument_id, price=exchange.get_last_price_book(instrument_id).asks[0].price, volume=10, side='bid', order_type='ioc')
-            #if instrument_id in stock_list:
-            #    stock_list.remove(instrument_id)
+class DualListingTrader:
+    """
+    Dual listing arbitrage strategy.
+
+    The exchange connection and position cache are passed in so that several
+    strategies can share them within one process (see run_strategies.py).
+    """
+
+    # Wake on top-of-book changes, or every second to keep managing positions
+    wake_timeout = 1.0
+
+    def __init__(self, exchange, position_state, stock_pair_list=stock_pair_list, recorder=None, instrumentation=None,
+                 position_limit=100, params=DualListingParams()):
+        self.exchange = exchange
+        self.params = params
+        self.position_state = position_state
+        self.recorder = recorder
+        self.instrumentation = instrumentation or Instrumentation()
+        # Prefix of this strategy's stages, which may share one Instrumentation with other strategies
+        self.stage_prefix = f'{type(self).__name__}.'
+        self.stock_pair_list = stock_pair_list
+        self.stock_list = [stock for pair in stock_pair_list for stock in pair]
+        self.own_orders = OrderRegistry()
+        self.gateway = OrderGateway(exchange, self.own_orders)
+        self.quote_manager = QuoteManager(self.own_orders, self.gateway)
+        self.risk = RiskEngine(position_state, self.own_orders, position_limit, params.reduce_threshold, params.pair_limit)
+        self.market_data = MarketDataEngine(exchange, self.stock_list, recorder=recorder)
+        hedges = {stock_id: stock_id_dual for stock_id, stock_id_dual in stock_pair_list}
+        hedges.update({stock_id_dual: stock_id for stock_id, stock_id_dual in stock_pair_list})
+        self.inventory = InventoryManager(self.risk, self.market_data, self.gateway, self.quote_manager, hedges,
+                                          params.unwind_target, params.max_unwind_cost, params.passive_requote_interval)
+        self.passive_requote_at = {}
+        # Best pri bid, pri ask, sec bid, sec ask for every pair, refilled in place each iteration
+        self.pair_tops = np.full((4, len(stock_pair_list)), np.nan)
+        # Replaced by the simulated exchange's clock when backtesting
+        self.clock = time.monotonic
+        self.own_orders.sync(exchange, self.market_data.instrument_ids)
+
+    def poll_fills(self, instrument_ids):
+        for trade in self.position_state.poll_fills(instrument_ids):
+            self.own_orders.on_fill(trade)
+            self.inventory.on_fill(trade)
+            if self.recorder:
+                self.recorder.record_fill(trade)
+
+    def scale_to_limits(self, stock_id, pri_side, pri_volume, stock_id_dual, sec_side, sec_volume, include_resting=True):
+        scaled_pri_volume, scaled_sec_volume = self.risk.scale_pair(stock_id, pri_side, pri_volume, stock_id_dual, sec_side, sec_volume, include_resting)
+        if (scaled_pri_volume, scaled_sec_volume) != (pri_volume, sec_volume):
+            logger.info('Scaled %s %s & %s %s from %.0f & %.0f to %.0f & %.0f lot(s) to stay within position limits.',
+                        stock_id, pri_side, stock_id_dual, sec_side, pri_volume, sec_volume, scaled_pri_volume, scaled_sec_volume)
+        return scaled_pri_volume, scaled_sec_volume
+
+    def external_best(self, instrument_id, side):
+        # Our own resting quotes are taken out, so passive quotes are priced off other participants' orders
+        # instead of stepping over themselves on every re-quote
+        price = self.market_data.mirror(instrument_id).best_excluding(side, self.own_orders.levels(instrument_id, side))
+        return np.nan if price is None else price
+
+    def record_tick_to_order(self):
+        if self.market_data.last_update_time is not None:
+            self.instrumentation.record(self.stage_prefix + 'tick_to_order', time.perf_counter() - self.market_data.last_update_time)
+
+    def trade_iteration(self, changed_instruments):
+        timer = self.instrumentation.timer(self.stage_prefix)
+        logger.debug('Trade loop iteration entered')
+
+        # Drain fills before refreshing positions, so fills already in the snapshot are not applied on top of it
+        # (see PositionState for the race this leaves)
+        self.poll_fills(self.market_data.instrument_ids)
+        positions = self.position_state.refresh(self.market_data.instrument_ids)
+        timer.mark('positions')
+        self.position_state.log_positions_and_pnl(always_display=self.stock_list)
+
+        ### Unwind positions that reached the reduce threshold, only looking at those changed by fills
+        unwind_orders = self.inventory.update(self.clock())
+        if unwind_orders:
+            self.gateway.wait(unwind_orders)
+            self.poll_fills(self.market_data.instrument_ids)
+        timer.mark('inventory')
     
-    print_positions_and_pnl(always_display=[stock for pair in stock_pair_list for stock in pair])
-    print(f'')
-
-    ########################################
-    ####### (1) Dual Listing Trading #######
-    ########################################
-    for stock_id, stock_id_dual in stock_pair_list:
-
-        stock_order_pri_book = exchange.get_last_price_book(stock_id)
-        stock_order_sec_book = exchange.get_last_price_book(stock_id_dual)
-        if (stock_order_pri_book and stock_order_pri_book.bids and stock_order_pri_book.asks and stock_order_sec_book and stock_order_sec_book.bids and stock_order_sec_book.asks):
-            # Obtain best bid and ask prices from order books
-            best_pri_bid_price = stock_order_pri_book.bids[0].price
-            best_pri_ask_price = stock_order_pri_book.asks[0].price
-            best_sec_bid_price = stock_order_sec_book.bids[0].price
-            best_sec_ask_price = stock_order_sec_book.asks[0].price
-            print(f'Top level prices for {stock_id}: {best_pri_bid_price:.2f} :: {best_pri_ask_price:.2f}')
-            print(f'Top level prices for {stock_id_dual}: {best_sec_bid_price:.2f} :: {best_sec_ask_price:.2f}')
-        else:    
-            print(f'Order book for {stock_id} or {stock_id_dual} does not have bids or offers. Skipping iteration.')
-            continue
-
-        # Decide whether to buy or sell
-        # (1) Active Arb Strat (No overlap in spread)
-        if best_sec_bid_price > best_pri_ask_price:
-            strat = 'active'
-            pri_side = 'bid'
-            sec_side = 'ask'
-            pri_price = best_pri_ask_price
-            sec_price = best_sec_bid_price
-        elif best_pri_bid_price > best_sec_ask_price:
-            strat = 'active'
-            pri_side = 'ask'
-            sec_side = 'bid'
-            pri_price = best_pri_bid_price
-            sec_price = best_sec_ask_price
-        
-        # (2) Passive Arb Strat (Have overlap in spread)
-        elif best_pri_ask_price > best_sec_ask_price:
-            strat = 'passive'
-            pri_side = 'ask'
-            pri_price = best_pri_ask_price - 0.01
-            sec_side = 'bid'
-            sec_price = best_sec_bid_price + 0.01
-        elif best_sec_ask_price > best_pri_ask_price:
-            strat = 'passive'
-            pri_side = 'bid'
-            pri_price = best_pri_bid_price + 0.01
-            sec_side = 'ask'
-            sec_price = best_sec_ask_price - 0.01
-        else:
-            strat = 'do nothing'
-        
-
-        if strat == 'do nothing':
-            print(f'''Skipping as {stock_id} bid-ask is {best_pri_bid_price:.0f}::{best_pri_ask_price:.0f} & {stock_id_dual} bid-ask is {best_sec_bid_price:.0f}::{best_sec_ask_price:.0f}''')
-            continue
-        
-        if strat == 'active':
-            pri_volume = 4
-            sec_volume = 4
-            if (positions[stock_id] >= 0 and pri_side == 'ask') or (positions[stock_id] <= 0 and pri_side == 'bid'):
-                pri_volume += 26
-            if (positions[stock_id_dual] >= 0 and sec_side == 'ask') or (positions[stock_id_dual] <= 0 and sec_side == 'bid'):
-                sec_volume += 26
-            if not (trade_would_breach_position_limit(stock_id, pri_volume, pri_side, stock_id_breach) or trade_would_breach_position_limit(stock_id_dual, sec_volume, sec_side, stock_id_dual_breach) or is_self_trade(stock_id, pri_side, pri_price) or is_self_trade(stock_id_dual, sec_side, sec_price)):
-                print(f'''Inserting {pri_side} for {stock_id}: {pri_volume:.0f} lot(s) at price {pri_price:.2f}.''')
-                print(f'''Inserting {sec_side} for {stock_id_dual}: {sec_volume:.0f} lot(s) at price {sec_price:.2f}.''')
-                exchange.insert_order(
-                    instrument_id=stock_id,
-                    price=pri_price,
-                    volume=pri_volume,
-                    side=pri_side,
-                    order_type='ioc')
-                exchange.insert_order(
-                    instrument_id=stock_id_dual,
-                    price=sec_price,
-                    volume=sec_volume,
-                    side=sec_side,
-                    order_type='ioc')
-            else:
-                print(f'''Not inserting {pri_volume:.0f} lot {pri_side} for {stock_id} to avoid position-limit breach.''')
-                print(f'''Not inserting {sec_volume:.0f} lot {sec_side} for {stock_id_dual} to avoid position-limit breach.''')
-
-        # Insert limit orders for passive arb strategy
-        elif strat == 'passive':
-            pri_volume = 4
-            sec_volume = 4
-            if (positions[stock_id] >= 0 and pri_side == 'ask') or (positions[stock_id] <= 0 and pri_side == 'bid'):
-                pri_volume += 16
-                stock_id_breach = False
-            if (positions[stock_id_dual] >= 0 and sec_side == 'ask') or (positions[stock_id_dual] <= 0 and sec_side == 'bid'):
-                sec_volume += 16
-                stock_id_dual_breach = False
-            if not (trade_would_breach_position_limit(stock_id, pri_volume, pri_side, stock_id_breach) or trade_would_breach_position_limit(stock_id_dual, sec_volume, sec_side, stock_id_dual_breach) or is_self_trade(stock_id, pri_side, pri_price) or is_self_trade(stock_id_dual, sec_side, sec_price)):
-                exchange.delete_orders(stock_id)
-                exchange.delete_orders(stock_id_dual)
-                print(f'''Inserting {pri_side} for {stock_id}: {pri_volume:.0f} lot(s) at price {pri_price:.2f}.''')
-                print(f'''Inserting {sec_side} for {stock_id_dual}: {sec_volume:.0f} lot(s) at price {sec_price:.2f}.''')
-                exchange.insert_order(
-                    instrument_id=stock_id,
-                    price=pri_price,
-                    volume=pri_volume,
-                    side=pri_side,
-                    order_type='limit')
-                exchange.insert_order(
-                    instrument_id=stock_id_dual,
-                    price=sec_price,
-                    volume=sec_volume,
-                    side=sec_side,
-                    order_type='limit')
-                time.sleep(2.5)
-            else:
-                print(f'''Not inserting {pri_volume:.0f} lot {pri_side} for {stock_id} to avoid position-limit breach.''')
-                print(f'''Not inserting {sec_volume:.0f} lot {sec_side} for {stock_id_dual} to avoid position-limit breach.''')
-
-    print(f'\nSleeping for 1 seconds.')
-    time.sleep(0.5)
+        self.position_state.log_positions_and_pnl(always_display=self.stock_list)
+
+        ########################################
+        ####### (1) Dual Listing Trading #######
+        ########################################
+        # Decide every pair in one pass over the best prices in the local book mirrors
+        pair_tops = self.pair_tops
+        for i, (stock_id, stock_id_dual) in enumerate(self.stock_pair_list):
+            pair_tops[0, i] = self.external_best(stock_id, 'bid')
+            pair_tops[1, i] = self.external_best(stock_id, 'ask')
+            pair_tops[2, i] = self.external_best(stock_id_dual, 'bid')
+            pair_tops[3, i] = self.external_best(stock_id_dual, 'ask')
+        strats, pri_sides, pri_prices, sec_prices = dual_listing_signals(*pair_tops, price_improvement=self.params.price_improvement)
+        timer.mark('signals')
+
+        for i, (stock_id, stock_id_dual) in enumerate(self.stock_pair_list):
+            if stock_id not in changed_instruments and stock_id_dual not in changed_instruments:
+                continue
+
+            best_pri_bid_price, best_pri_ask_price, best_sec_bid_price, best_sec_ask_price = pair_tops[:, i].tolist()
+            if np.isnan(pair_tops[:, i]).any():
+                logger.info('Order book for %s or %s does not have bids or offers. Skipping iteration.', stock_id, stock_id_dual)
+                continue
+            logger.debug('Top level prices for %s: %.2f :: %.2f', stock_id, best_pri_bid_price, best_pri_ask_price)
+            logger.debug('Top level prices for %s: %.2f :: %.2f', stock_id_dual, best_sec_bid_price, best_sec_ask_price)
+
+            if strats[i] == STRAT_NONE:
+                logger.debug('Skipping as %s bid-ask is %.0f::%.0f & %s bid-ask is %.0f::%.0f', stock_id, best_pri_bid_price, best_pri_ask_price, stock_id_dual, best_sec_bid_price, best_sec_ask_price)
+                continue
+
+            # (1) Active Arb Strat (No overlap in spread) or (2) Passive Arb Strat (Have overlap in spread)
+            strat = 'active' if strats[i] == STRAT_ACTIVE else 'passive'
+            pri_side = 'bid' if pri_sides[i] == BID else 'ask'
+            sec_side = 'ask' if pri_sides[i] == BID else 'bid'
+            pri_price = float(pri_prices[i])
+            sec_price = float(sec_prices[i])
+
+            if strat == 'active':
+                pri_volume = leg_volume(positions[stock_id], pri_side, self.params.active_base_volume, self.params.active_extra_volume)
+                sec_volume = leg_volume(positions[stock_id_dual], sec_side, self.params.active_base_volume, self.params.active_extra_volume)
+                pri_volume, sec_volume = self.scale_to_limits(stock_id, pri_side, pri_volume, stock_id_dual, sec_side, sec_volume)
+                if pri_volume > 0 and not (is_self_trade(self.own_orders, stock_id, pri_side, pri_price) or is_self_trade(self.own_orders, stock_id_dual, sec_side, sec_price)):
+                    logger.info('Inserting %s for %s: %.0f lot(s) at price %.2f.', pri_side, stock_id, pri_volume, pri_price)
+                    logger.info('Inserting %s for %s: %.0f lot(s) at price %.2f.', sec_side, stock_id_dual, sec_volume, sec_price)
+                    leg_orders = self.gateway.submit_legs([
+                        Leg(stock_id, pri_price, pri_volume, pri_side, 'ioc'),
+                        Leg(stock_id_dual, sec_price, sec_volume, sec_side, 'ioc')])
+                    self.record_tick_to_order()
+                    results = self.gateway.wait(leg_orders)
+                    for result in results:
+                        logger.info('Leg %s for %s acked in %.1f ms.', result.leg.side, result.leg.instrument_id, result.latency * 1000)
+                    self.poll_fills([stock_id, stock_id_dual])
+                else:
+                    logger.info('Not trading %s for %s & %s for %s to avoid position-limit breach or self-trade.', pri_side, stock_id, sec_side, stock_id_dual)
+
+            # Insert limit orders for passive arb strategy
+            elif strat == 'passive':
+                if self.clock() < self.passive_requote_at.get(stock_id, 0):
+                    logger.debug('Leaving passive quotes on %s & %s resting.', stock_id, stock_id_dual)
+                    continue
+                if self.inventory.is_unwinding(stock_id) or self.inventory.is_unwinding(stock_id_dual):
+                    logger.debug('Not quoting %s & %s while unwinding a position in them.', stock_id, stock_id_dual)
+                    continue
+                pri_volume = leg_volume(positions[stock_id], pri_side, self.params.passive_base_volume, self.params.passive_extra_volume)
+                sec_volume = leg_volume(positions[stock_id_dual], sec_side, self.params.passive_base_volume, self.params.passive_extra_volume)
+                # The new quotes replace our resting ones on the same side, so those do not count towards the limit
+                pri_volume, sec_volume = self.scale_to_limits(stock_id, pri_side, pri_volume, stock_id_dual, sec_side, sec_volume, include_resting=False)
+                if pri_volume > 0 and not (is_self_trade(self.own_orders, stock_id, pri_side, pri_price) or is_self_trade(self.own_orders, stock_id_dual, sec_side, sec_price)):
+                    logger.info('Quoting %s for %s: %.0f lot(s) at price %.2f.', pri_side, stock_id, pri_volume, pri_price)
+                    logger.info('Quoting %s for %s: %.0f lot(s) at price %.2f.', sec_side, stock_id_dual, sec_volume, sec_price)
+                    # Only send what differs from our resting quotes, the other side of each book is pulled
+                    quote_messages = (self.quote_manager.update_quotes(stock_id, {pri_side: (pri_price, pri_volume)})
+                                      + self.quote_manager.update_quotes(stock_id_dual, {sec_side: (sec_price, sec_volume)}))
+                    self.record_tick_to_order()
+                    self.gateway.wait(quote_messages)
+                    logger.info('Sent %s message(s) to update quotes on %s & %s.', len(quote_messages), stock_id, stock_id_dual)
+                    self.passive_requote_at[stock_id] = self.clock() + self.params.passive_requote_interval
+                else:
+                    logger.info('Not trading %s for %s & %s for %s to avoid position-limit breach or self-trade.', pri_side, stock_id, sec_side, stock_id_dual)
+
+    def run(self):
+        while True:
+            timer = self.instrumentation.timer(self.stage_prefix)
+            changed_instruments = self.market_data.wait_for_update(timeout=self.wake_timeout)
+            timer.mark('wait_for_update')
+            self.trade_iteration(changed_instruments)
+            timer.mark('trade_iteration')
+
+
+if __name__ == '__main__':
+    # Imported here so the strategy can be backtested without the optibook client installed
+    from optibook.synchronous_client import Exchange
+
+    instrumentation = Instrumentation()
+    instrumentation.install('instrumentation.json')
+    exchange = InstrumentedExchange(Exchange(), instrumentation)
+    exchange.connect()
+
+    logging.getLogger('client').setLevel('ERROR')
+    setup_logging('INFO')
+
+    recorder = MarketDataRecorder('recordings')
+    try:
+        DualListingTrader(exchange, PositionState(exchange), recorder=recorder, instrumentation=instrumentation).run()
+    finally:
+        recorder.close()
@@ -1,222 +1,227 @@
-import datetime as dt
 import time
 import random
 import logging
+from collections import namedtuple
 
-from optibook.synchronous_client import Exchange
 import numpy as np
 
-exchange = Exchange()
-exchange.connect()
+from instrumentation import Instrumentation, InstrumentedExchange
+from event_log import setup_logging
+from fair_value import EtfFairValueModel, EtfFuturePair
+from market_data import MarketDataEngine
+from order_gateway import Leg, OrderGateway
+from own_orders import OrderRegistry
+from quote_manager import QuoteManager
+from recorder import MarketDataRecorder
+from risk import RiskEngine
+from signals import BID, STRAT_ACTIVE, STRAT_NONE, etf_futures_signals, leg_volume
+from position_state import PositionState
 
-logging.getLogger('client').setLevel('ERROR')
+logger = logging.getLogger('trading.etf_futures')
 
 
-def trade_would_breach_position_limit(instrument_id, volume, side, position_limit=100):
-    positions = exchange.get_positions()
-    position_instrument = positions[instrument_id]
-
-    if side == 'bid':
-        return position_instrument + volume > position_limit
-    elif side == 'ask':
-        return position_instrument - volume < -position_limit
-    else:
-        raise Exception(f'''Invalid side provided: {side}, expecting 'bid' or 'ask'.''')
-
-def amt_to_reduce_position(instrument_id, volume, side, position_limit=100):
-    positions = exchange.get_positions()
-    position_instrument = positions[instrument_id]
-
-    if side == 'bid':
-        return 'ask', (position_instrument + volume) - position_limit
-    elif side == 'ask':
-        return 'bid', (-position_limit) - (position_instrument - volume)
-
-def print_positions_and_pnl(always_display=None):
-    positions = exchange.get_positions()
-    print('Positions:')
-    for instrument_id in positions:
-        if not always_display or instrument_id in always_display or positions[instrument_id] != 0:
-            print(f'  {instrument_id:20s}: {positions[instrument_id]:4.0f}')
-
-    pnl = exchange.get_pnl()
-    if pnl:
-        print(f'\nPnL: {pnl:.2f}')
-
-def is_self_trade(instrument_id, side, price):
+def is_self_trade(own_orders, instrument_id, side, price):
     """
     Check if placing a limit order at this price would result in a self-trade.
 
     Args:
-        exchange: The optibook exchange object.
+        own_orders: The OrderRegistry of our resting orders.
         instrument_id: The instrument you're trading.
-        side: 'buy' or 'sell' for the incoming order.
+        side: 'bid' or 'ask' for the incoming order.
         price: Price of the order you're about to place.
 
     Returns:
         True if placing this order could result in a self-trade, False otherwise.
     """
-    outstanding_orders = list(exchange.get_outstanding_orders(instrument_id).values())
-
-    # Finding opposite orders
-    my_opposite_orders = [o for o in outstanding_orders if o.side != side]
-
-    # Check if the incoming price would match with any of my opposite orders
-    if side == 'bid':
-        # Buying at a price >= my own sell (ask)
-        for order in my_opposite_orders:
-            if (order.side == 'ask' and price >= order.price):
-                return True
-    elif side == 'ask':
-        # Selling at a price <= my own buy (bid)
-        for order in my_opposite_orders:
-            if (order.side == 'bid' and price <= order.price):
-                return True
-
-    return False
-
-
-while True:
-    print(f'')
-    print(f'-----------------------------------------------------------------')
-    print(f'TRADE LOOP ITERATION ENTERED AT {str(dt.datetime.now()):18s} UTC.')
-    print(f'-----------------------------------------------------------------')
-
-    etf_id = 'OB5X_ETF'
-    fut_id = 'OB5X_202509_F'
-
-    positions = exchange.get_positions()
-    print(f'')
-
-    ### Check for near-limit positions & reduce those positions
-    for instrument_id in positions:
-        if (positions[instrument_id] >= 96 and exchange.get_last_price_book(instrument_id).bids):
-            print(f'Position in {instrument_id} about to breach position limit, removing any trades on it.')
-            if instrument_id == etf_id:
-                etf_id = 'NIL'
-        elif (positions[instrument_id] <= -96 and exchange.get_last_price_book(instrument_id).asks):
-            print(f'Position in {instrument_id} about to breach position limit, removing any trades on it.')
-            if instrument_id == etf_id:
-                etf_id = 'NIL'
-    
-    print(f'')
-    
-    ########################################
-    ######### (2) ETF FUT Trading ##########
-    ########################################
-    if etf_id == 'NIL':
-        continue
-
-    etf_book = exchange.get_last_price_book(etf_id)
-    fut_book = exchange.get_last_price_book(fut_id)
-    if (etf_book and fut_book and etf_book.bids and etf_book.asks and fut_book.bids and fut_book.asks):
-        # Obtain best bid and ask prices from order books
-        best_fut_bid = fut_book.bids[0].price
-        best_fut_ask = fut_book.asks[0].price
-        best_etf_bid = etf_book.bids[0].price
-        best_etf_ask = etf_book.asks[0].price
-
-        ind_fair_bid = best_fut_bid*np.exp(-0.03*0.04)
-        ind_fair_ask = best_fut_ask*np.exp(-0.03*0.04)
-        etf_fair_bid = float(round((ind_fair_bid*0.25) + 2.5 - 0.01, 2))
-        etf_fair_ask = float(round((ind_fair_ask*0.25) + 2.5 + 0.01, 2))
-    else:
-        print(f'Order book for {etf_id} or {fut_id} does not have bids or offers. Skipping iteration.')
-        continue
-    
-    # Decide whether to buy or sell
-    # (1) Active Arb Strat (No overlap in spread)
-    # (a) if best_etf_ask < etf_fair_bid => ETF is cheap, buy ETF, sell futures at bid
-    if etf_fair_bid > best_etf_ask:
-        strat = 'active'
-        etf_side = 'bid'
-        fut_side = 'ask'
-        etf_price = best_etf_ask
-        fut_price = best_fut_bid
-    
-    # (b) # etf_fair_ask < if best_etf_bid => ETF is expensive, sell ETF, buy futures at ask
-    elif etf_fair_ask < best_etf_bid:
-        strat = 'active'
-        etf_side = 'ask'
-        fut_side = 'bid'
-        etf_price = best_etf_bid
-        fut_price = best_fut_ask
-        
-    # (2) Passive Arb Strat (Have overlap in spread)
-    elif best_etf_ask > etf_fair_ask:
-        strat = 'passive'
-        etf_side = 'ask'
-        etf_price = best_etf_ask - 0.01
-        fut_side = 'bid'
-        fut_price = best_fut_ask
-    elif etf_fair_ask > best_etf_ask:
-        strat = 'passive'
-        etf_side = 'bid'
-        etf_price = best_etf_ask
-        fut_side = 'ask'
-        fut_price = best_fut_ask - 0.01
-    else:
-        strat = 'do nothing'
-        
-    if strat == 'do nothing':
-        print(f'''Skipping as {etf_id} bid-ask is {best_etf_bid:.0f}::{best_etf_ask:.0f} & {fut_id} bid-ask is {best_fut_bid:.0f}::{best_fut_ask:.0f}''')
-        continue
-
-    # Insert IOC orders for active arb strategy
-    if strat == 'active':
-        etf_volume = 3
-        fut_volume = 3
-        if (positions[etf_id] >= 0 and etf_side == 'ask') or (positions[etf_id] <= 0 and etf_side == 'bid'):
-            etf_volume += 27
-        if (positions[fut_id] >= 0 and fut_side == 'ask') or (positions[fut_id] <= 0 and fut_side == 'bid'):
-            fut_volume += 27
-        if not (trade_would_breach_position_limit(etf_id, etf_volume, etf_side) or trade_would_breach_position_limit(fut_id, fut_volume, fut_side) or is_self_trade(etf_id, etf_side, etf_price) or is_self_trade(fut_id, fut_side, fut_price)):
-            print(f'''Inserting {etf_side} for {etf_id}: {etf_volume:.0f} lot(s) at price {etf_price:.2f}.''')
-            print(f'''Inserting {fut_side} for {fut_id}: {fut_volume:.0f} lot(s) at price {fut_price:.2f}.''')
-            exchange.insert_order(
-                instrument_id=etf_id,
-                price=etf_price,
-                volume=etf_volume,
-                side=etf_side,
-                order_type='limit')
-            exchange.insert_order(
-                instrument_id=fut_id,
-                price=fut_price,
-                volume=fut_volume,
-                side=fut_side,
-                order_type='limit')
-        else:
-            print(f'''Not inserting {etf_volume:.0f} lot {etf_side} for {etf_id} to avoid position-limit breach.''')
-            print(f'''Not inserting {fut_volume:.0f} lot {fut_side} for {fut_id} to avoid position-limit breach.''')
-
-    # Insert limit orders for passive arb strategy
-    elif strat == 'passive':
-        etf_volume = 3
-        fut_volume = 3
-        if (positions[etf_id] >= 0 and etf_side == 'ask') or (positions[etf_id] <= 0 and etf_side == 'bid'):
-            etf_volume += 27
-        if (positions[fut_id] >= 0 and fut_side == 'ask') or (positions[fut_id] <= 0 and fut_side == 'bid'):
-            fut_volume += 27
-        if not (trade_would_breach_position_limit(etf_id, etf_volume, etf_side) or trade_would_breach_position_limit(fut_id, fut_volume, fut_side) or is_self_trade(etf_id, etf_side, etf_price) or is_self_trade(fut_id, fut_side, fut_price)):
-            #exchange.delete_orders(stock_id)
-            #exchange.delete_orders(stock_id_dual)
-            print(f'''Inserting {etf_side} for {etf_id}: {etf_volume:.0f} lot(s) at price {etf_price:.2f}.''')
-            print(f'''Inserting {fut_side} for {fut_id}: {fut_volume:.0f} lot(s) at price {fut_price:.2f}.''')
-            exchange.insert_order(
-                instrument_id=etf_id,
-                price=etf_price,
-                volume=etf_volume,
-                side=etf_side,
-                order_type='limit')
-            exchange.insert_order(
-                instrument_id=fut_id,
-                price=fut_price,
-                volume=fut_volume,
-                side=fut_side,
-                order_type='limit')
-        else:
-            print(f'''Not inserting {etf_volume:.0f} lot {etf_side} for {etf_id} to avoid position-limit breach.''')
-            print(f'''Not inserting {fut_volume:.0f} lot {fut_side} for {fut_id} to avoid position-limit breach.''')
-
-    print(f'\nSleeping for 3 seconds.')
-    time.sleep(3)
\ No newline at end of file
+    return own_orders.is_self_trade(instrument_id, side, price)
+
+# Tunable strategy parameters, see sweep.py for evaluating grids of them offline.
+# A leg trades the base volume, plus the extra volume when it does not add to an existing position.
+# pair_limit caps the absolute net position across the ETF and the futures in ETF lots, a futures lot counting as
+# 1 / ratio ETF lots.
+EtfFuturesParams = namedtuple('EtfFuturesParams', ['active_base_volume', 'active_extra_volume', 'passive_base_volume',
+                                                   'passive_extra_volume', 'price_improvement', 'reduce_threshold',
+                                                   'pair_limit', 'passive_requote_interval'],
+                              defaults=(3, 27, 3, 27, 0.01, 96, 40, 3))
+
+
+class EtfFuturesTrader:
+    """
+    ETF vs futures arbitrage strategy.
+
+    The exchange connection and position cache are passed in so that several
+    strategies can share them within one process (see run_strategies.py).
+    """
+
+    # Only wake on top-of-book changes: an iteration without them returns before trading, and positions are only
+    # acted on when quoting, so a periodic wake would just spend round-trips refreshing them
+    wake_timeout = None
+
+    def __init__(self, exchange, position_state, etf_id='OB5X_ETF', fut_id='OB5X_202509_F', recorder=None,
+                 instrumentation=None, ratio=0.25, offset=2.5, rate=0.03, time_to_expiry=0.04, position_limit=100,
+                 params=EtfFuturesParams()):
+        self.exchange = exchange
+        self.params = params
+        self.position_state = position_state
+        self.recorder = recorder
+        self.instrumentation = instrumentation or Instrumentation()
+        # Prefix of this strategy's stages, which may share one Instrumentation with other strategies
+        self.stage_prefix = f'{type(self).__name__}.'
+        self.etf_id = etf_id
+        self.fut_id = fut_id
+        self.fair_value = EtfFairValueModel([EtfFuturePair(etf_id, fut_id, ratio, offset, rate, time_to_expiry)])
+        self.own_orders = OrderRegistry()
+        self.gateway = OrderGateway(exchange, self.own_orders)
+        self.quote_manager = QuoteManager(self.own_orders, self.gateway)
+        self.risk = RiskEngine(position_state, self.own_orders, position_limit, params.reduce_threshold, params.pair_limit,
+                               hedge_ratios={(etf_id, fut_id): ratio})
+        self.market_data = MarketDataEngine(exchange, [etf_id, fut_id], recorder=recorder)
+        self.passive_requote_at = 0
+        # Best ETF bid, ETF ask, futures bid, futures ask, refilled in place each iteration
+        self.tops = np.full(4, np.nan)
+        # Replaced by the simulated exchange's clock when backtesting
+        self.clock = time.monotonic
+        self.own_orders.sync(exchange, self.market_data.instrument_ids)
+
+    def poll_fills(self, instrument_ids):
+        for trade in self.position_state.poll_fills(instrument_ids):
+            self.own_orders.on_fill(trade)
+            if self.recorder:
+                self.recorder.record_fill(trade)
+
+    def scale_to_limits(self, etf_volume, etf_side, fut_volume, fut_side, include_resting=True):
+        scaled_etf_volume, scaled_fut_volume = self.risk.scale_pair(self.etf_id, etf_side, etf_volume, self.fut_id, fut_side, fut_volume, include_resting)
+        if (scaled_etf_volume, scaled_fut_volume) != (etf_volume, fut_volume):
+            logger.info('Scaled %s %s & %s %s from %.0f & %.0f to %.0f & %.0f lot(s) to stay within position limits.',
+                        self.etf_id, etf_side, self.fut_id, fut_side, etf_volume, fut_volume, scaled_etf_volume, scaled_fut_volume)
+        return scaled_etf_volume, scaled_fut_volume
+
+    def external_best(self, instrument_id, side):
+        # Our own resting quotes are taken out, so passive quotes are priced off other participants' orders
+        # instead of stepping over themselves on every re-quote
+        price = self.market_data.mirror(instrument_id).best_excluding(side, self.own_orders.levels(instrument_id, side))
+        return np.nan if price is None else price
+
+    def record_tick_to_order(self):
+        if self.market_data.last_update_time is not None:
+            self.instrumentation.record(self.stage_prefix + 'tick_to_order', time.perf_counter() - self.market_data.last_update_time)
+
+    def trade_iteration(self, changed_instruments):
+        timer = self.instrumentation.timer(self.stage_prefix)
+        logger.debug('Trade loop iteration entered')
+
+        etf_id = self.etf_id
+        fut_id = self.fut_id
+
+        # Drain fills before refreshing positions, so fills already in the snapshot are not applied on top of it
+        # (see PositionState for the race this leaves)
+        self.poll_fills(self.market_data.instrument_ids)
+        positions = self.position_state.refresh(self.market_data.instrument_ids)
+        timer.mark('positions')
+
+        ########################################
+        ######### (2) ETF FUT Trading ##########
+        ########################################
+        if not changed_instruments:
+            return
+
+        # Obtain best bid and ask prices from the local book mirrors
+        tops = self.tops
+        tops[:] = (self.external_best(etf_id, 'bid'), self.external_best(etf_id, 'ask'),
+                   self.external_best(fut_id, 'bid'), self.external_best(fut_id, 'ask'))
+        if np.isnan(tops).any():
+            logger.info('Order book for %s or %s does not have bids or offers. Skipping iteration.', etf_id, fut_id)
+            return
+        best_etf_bid, best_etf_ask, best_fut_bid, best_fut_ask = tops.tolist()
+
+        # Decide whether to buy or sell with the same batched kernel used for N pairs
+        # Only recomputed when the futures top of book moved
+        etf_fair_bid, etf_fair_ask = self.fair_value.update(tops[2:3], tops[3:4])
+        strats, etf_sides, etf_prices, fut_prices = etf_futures_signals(
+            tops[0:1], tops[1:2], etf_fair_bid, etf_fair_ask, tops[2:3], tops[3:4], self.params.price_improvement)
+        timer.mark('signals')
+
+        if strats[0] == STRAT_NONE:
+            logger.debug('Skipping as %s bid-ask is %.0f::%.0f & %s bid-ask is %.0f::%.0f', etf_id, best_etf_bid, best_etf_ask, fut_id, best_fut_bid, best_fut_ask)
+            return
+
+        # (1) Active Arb Strat (No overlap in spread) or (2) Passive Arb Strat (Have overlap in spread)
+        strat = 'active' if strats[0] == STRAT_ACTIVE else 'passive'
+        etf_side = 'bid' if etf_sides[0] == BID else 'ask'
+        fut_side = 'ask' if etf_sides[0] == BID else 'bid'
+        etf_price = float(etf_prices[0])
+        fut_price = float(fut_prices[0])
+
+        # Near the position limit, only trade in the direction that reduces the ETF position
+        etf_reduce_side = self.risk.reduce_side(etf_id)
+        if etf_reduce_side is not None and etf_side != etf_reduce_side:
+            logger.warning('Position in %s about to breach position limit, not adding to it.', etf_id)
+            return
+
+        # Insert IOC orders for active arb strategy
+        if strat == 'active':
+            etf_volume = leg_volume(positions[etf_id], etf_side, self.params.active_base_volume, self.params.active_extra_volume)
+            fut_volume = leg_volume(positions[fut_id], fut_side, self.params.active_base_volume, self.params.active_extra_volume)
+            etf_volume, fut_volume = self.scale_to_limits(etf_volume, etf_side, fut_volume, fut_side)
+            if etf_volume > 0 and not (is_self_trade(self.own_orders, etf_id, etf_side, etf_price) or is_self_trade(self.own_orders, fut_id, fut_side, fut_price)):
+                logger.info('Inserting %s for %s: %.0f lot(s) at price %.2f.', etf_side, etf_id, etf_volume, etf_price)
+                logger.info('Inserting %s for %s: %.0f lot(s) at price %.2f.', fut_side, fut_id, fut_volume, fut_price)
+                leg_orders = self.gateway.submit_legs([
+                    Leg(etf_id, etf_price, etf_volume, etf_side, 'limit'),
+                    Leg(fut_id, fut_price, fut_volume, fut_side, 'limit')])
+                self.record_tick_to_order()
+                results = self.gateway.wait(leg_orders)
+                for result in results:
+                    logger.info('Leg %s for %s acked in %.1f ms.', result.leg.side, result.leg.instrument_id, result.latency * 1000)
+                self.poll_fills([etf_id, fut_id])
+            else:
+                logger.info('Not trading %s for %s & %s for %s to avoid position-limit breach or self-trade.', etf_side, etf_id, fut_side, fut_id)
+
+        # Insert limit orders for passive arb strategy
+        elif strat == 'passive':
+            if self.clock() < self.passive_requote_at:
+                logger.debug('Leaving passive quotes on %s & %s resting.', etf_id, fut_id)
+                return
+            etf_volume = leg_volume(positions[etf_id], etf_side, self.params.passive_base_volume, self.params.passive_extra_volume)
+            fut_volume = leg_volume(positions[fut_id], fut_side, self.params.passive_base_volume, self.params.passive_extra_volume)
+            # The new quotes replace our resting ones on the same side, so those do not count towards the limit
+            etf_volume, fut_volume = self.scale_to_limits(etf_volume, etf_side, fut_volume, fut_side, include_resting=False)
+            if etf_volume > 0 and not (is_self_trade(self.own_orders, etf_id, etf_side, etf_price) or is_self_trade(self.own_orders, fut_id, fut_side, fut_price)):
+                logger.info('Quoting %s for %s: %.0f lot(s) at price %.2f.', etf_side, etf_id, etf_volume, etf_price)
+                logger.info('Quoting %s for %s: %.0f lot(s) at price %.2f.', fut_side, fut_id, fut_volume, fut_price)
+                # Replace our previous passive quotes instead of stacking new ones on top of them
+                quote_messages = (self.quote_manager.update_quotes(etf_id, {etf_side: (etf_price, etf_volume)})
+                                  + self.quote_manager.update_quotes(fut_id, {fut_side: (fut_price, fut_volume)}))
+                self.record_tick_to_order()
+                self.gateway.wait(quote_messages)
+                logger.info('Sent %s message(s) to update quotes on %s & %s.', len(quote_messages), etf_id, fut_id)
+                self.passive_requote_at = self.clock() + self.params.passive_requote_interval
+            else:
+                logger.info('Not trading %s for %s & %s for %s to avoid position-limit breach or self-trade.', etf_side, etf_id, fut_side, fut_id)
+
+    def run(self):
+        while True:
+            timer = self.instrumentation.timer(self.stage_prefix)
+            changed_instruments = self.market_data.wait_for_update(timeout=self.wake_timeout)
+            timer.mark('wait_for_update')
+            self.trade_iteration(changed_instruments)
+            timer.mark('trade_iteration')
+
+
+if __name__ == '__main__':
+    # Imported here so the strategy can be backtested without the optibook client installed
+    from optibook.synchronous_client import Exchange
+
+    instrumentation = Instrumentation()
+    instrumentation.install('instrumentation.json')
+    exchange = InstrumentedExchange(Exchange(), instrumentation)
+    exchange.connect()
+
+    logging.getLogger('client').setLevel('ERROR')
+    setup_logging('INFO')
+
+    recorder = MarketDataRecorder('recordings')
+    try:
+        EtfFuturesTrader(exchange, PositionState(exchange), recorder=recorder, instrumentation=instrumentation).run()
+    finally:
+        recorder.close()
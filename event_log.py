@@ -0,0 +1,47 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves message formatting to the listener thread.
+
+    The stock QueueHandler formats every record on the calling thread before
+    enqueueing it. Here the record is enqueued as is, so the trading thread
+    only pays for creating the record and a put() on the queue. Log calls
+    must therefore pass immutable arguments (or copies) with %-style
+    formatting, not pre-built f-strings.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(level='INFO', stream=None, logger_name='trading'):
+    """
+    Route the trading loggers through a queue to a background writer thread.
+
+    Args:
+        level: Minimum level of records to emit. Calls below it return before creating a record.
+        stream: Where to write formatted records, stdout by default.
+        logger_name: Parent logger of the loggers to route.
+
+    Returns:
+        The started QueueListener. It is stopped, flushing any queued records, at interpreter exit.
+    """
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)-5s %(name)s: %(message)s'))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+
+    logger = logging.getLogger(logger_name)
+    logger.setLevel(level)
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    logger.propagate = False
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
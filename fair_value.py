@@ -0,0 +1,68 @@
+from collections import namedtuple
+
+import numpy as np
+
+from signals import etf_fair_value
+
+EtfFuturePair = namedtuple('EtfFuturePair', ['etf_id', 'fut_id', 'ratio', 'offset', 'rate', 'time_to_expiry'],
+                           defaults=(0.25, 2.5, 0.03, 0.04))
+
+
+class EtfFairValueModel:
+    """
+    Incrementally updated ETF fair values for N ETF/future pairs.
+
+    The discount factor exp(-rate * time_to_expiry) is cached per pair and
+    only recomputed when the rate or time to expiry is changed. Fair bid/ask
+    are only recomputed for pairs whose futures top of book moved, so a tick
+    where nothing changed costs one array comparison.
+    """
+
+    def __init__(self, pairs):
+        self.pairs = list(pairs)
+        self.ratio = np.array([pair.ratio for pair in self.pairs], dtype=float)
+        self.offset = np.array([pair.offset for pair in self.pairs], dtype=float)
+        self.rate = np.array([pair.rate for pair in self.pairs], dtype=float)
+        self.time_to_expiry = np.array([pair.time_to_expiry for pair in self.pairs], dtype=float)
+        self.discount_factor = np.exp(-self.rate * self.time_to_expiry)
+
+        self.fut_bid = np.full(len(self.pairs), np.nan)
+        self.fut_ask = np.full(len(self.pairs), np.nan)
+        self.fair_bid = np.full(len(self.pairs), np.nan)
+        self.fair_ask = np.full(len(self.pairs), np.nan)
+        self.recompute_count = 0
+
+    def set_rate(self, i, rate):
+        self.rate[i] = rate
+        self._reprice(i)
+
+    def set_time_to_expiry(self, i, time_to_expiry):
+        self.time_to_expiry[i] = time_to_expiry
+        self._reprice(i)
+
+    def update(self, fut_bid, fut_ask):
+        """
+        Feed the latest futures best bid/ask of every pair.
+
+        Args:
+            fut_bid, fut_ask: Arrays of length N, NaN where a book side is empty.
+
+        Returns:
+            Arrays (fair_bid, fair_ask) of ETF fair values.
+        """
+        changed = ~(((fut_bid == self.fut_bid) | (np.isnan(fut_bid) & np.isnan(self.fut_bid)))
+                    & ((fut_ask == self.fut_ask) | (np.isnan(fut_ask) & np.isnan(self.fut_ask))))
+        if changed.any():
+            self.fut_bid[changed] = fut_bid[changed]
+            self.fut_ask[changed] = fut_ask[changed]
+            self._recompute(changed)
+        return self.fair_bid, self.fair_ask
+
+    def _reprice(self, i):
+        self.discount_factor[i] = np.exp(-self.rate[i] * self.time_to_expiry[i])
+        self._recompute(i)
+
+    def _recompute(self, index):
+        self.fair_bid[index], self.fair_ask[index] = etf_fair_value(
+            self.fut_bid[index], self.fut_ask[index], self.discount_factor[index], self.ratio[index], self.offset[index])
+        self.recompute_count += 1
@@ -0,0 +1,145 @@
+import atexit
+import json
+import signal
+import threading
+import time
+
+import numpy as np
+
+
+class LatencyStats:
+    """
+    Call count, total and max of a stage's latency, plus a ring buffer of recent samples for percentiles.
+    """
+
+    def __init__(self, window=4096):
+        self.samples = np.zeros(window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.samples[self.count % len(self.samples)] = seconds
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def summary(self):
+        recent = self.samples[:min(self.count, len(self.samples))]
+        p50, p99 = np.percentile(recent, [50, 99]) if self.count else (0.0, 0.0)
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': p50 * 1000,
+            'p99_ms': p99 * 1000,
+            'max_ms': self.max * 1000,
+        }
+
+
+class StageTimer:
+    """
+    Times consecutive stages of one loop iteration: each mark() records the time since the previous one.
+
+    Stage names are prefixed with prefix, so strategies sharing one Instrumentation keep separate stages.
+    """
+
+    def __init__(self, instrumentation, prefix=''):
+        self.instrumentation = instrumentation
+        self.prefix = prefix
+        self.last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.instrumentation.record(self.prefix + stage, now - self.last)
+        self.last = now
+
+
+class Instrumentation:
+    """
+    Per-stage latency statistics for exchange calls and decision stages.
+
+    Recording a sample is a perf_counter() difference and an array write, so
+    it can stay on in production. The collected statistics can be dumped on
+    demand (report(), or SIGUSR1 once install() has been called) and are
+    dumped on shutdown.
+    """
+
+    def __init__(self, window=4096):
+        self.window = window
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            if stage not in self.stats:
+                self.stats[stage] = LatencyStats(self.window)
+            self.stats[stage].add(seconds)
+
+    def timer(self, prefix=''):
+        return StageTimer(self, prefix)
+
+    def report(self):
+        """
+        Returns:
+            Dict of stage -> summary statistics, sorted by total time spent.
+        """
+        with self._lock:
+            stages = sorted(self.stats.items(), key=lambda item: item[1].total, reverse=True)
+            return {stage: stats.summary() for stage, stats in stages}
+
+    def print_report(self):
+        print(f'{"stage":32s} {"count":>8s} {"mean ms":>9s} {"p50 ms":>9s} {"p99 ms":>9s} {"max ms":>9s}')
+        for stage, summary in self.report().items():
+            print(f'''{stage:32s} {summary['count']:8d} {summary['mean_ms']:9.3f} {summary['p50_ms']:9.3f} {summary['p99_ms']:9.3f} {summary['max_ms']:9.3f}''')
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def install(self, path=None):
+        """
+        Print (and optionally save) the report on SIGUSR1 and at interpreter exit. Call from the main thread.
+        """
+        def dump_report():
+            self.print_report()
+            if path:
+                self.dump(path)
+
+        def on_signal(*args):
+            # The handler runs on the main thread between bytecodes, possibly while record() holds the
+            # non-reentrant lock, so the report is taken from another thread instead of waiting here
+            threading.Thread(target=dump_report, name='instrumentation-dump', daemon=True).start()
+
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, on_signal)
+        atexit.register(dump_report)
+
+
+class InstrumentedExchange:
+    """
+    Wraps an exchange so every method call is recorded as an 'exchange.<method>' stage.
+    """
+
+    def __init__(self, exchange, instrumentation):
+        self._exchange = exchange
+        self._instrumentation = instrumentation
+        self._wrapped = {}
+
+    def __getattr__(self, name):
+        attr = getattr(self._exchange, name)
+        if not callable(attr):
+            return attr
+        if name not in self._wrapped:
+            stage = f'exchange.{name}'
+            instrumentation = self._instrumentation
+
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return attr(*args, **kwargs)
+                finally:
+                    instrumentation.record(stage, time.perf_counter() - start)
+
+            self._wrapped[name] = timed
+        return self._wrapped[name]
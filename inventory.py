@@ -0,0 +1,113 @@
+import logging
+
+from order_gateway import Leg
+
+logger = logging.getLogger('trading.inventory')
+
+OPPOSITE_SIDE = {'bid': 'ask', 'ask': 'bid'}
+
+
+class InventoryManager:
+    """
+    Fill-driven unwinding of positions that reach the reduce threshold.
+
+    An instrument is only looked at when a fill changed its position, or when
+    its resting unwind quote is due to be re-priced, so iterations without
+    fills cost no book reads or messages. A position at or beyond the risk
+    engine's reduce threshold is unwound down to unwind_target:
+
+    1. through its hedge leg, when the hedge holds an offsetting position and
+       crossing both spreads costs at most max_unwind_cost per lot. Both legs
+       are traded IOC, reducing both positions while the pair stays hedged.
+    2. otherwise with a passive quote joining the best price on the reducing
+       side, sized to the volume already resting at that level.
+    """
+
+    def __init__(self, risk, market_data, gateway, quote_manager, hedges, unwind_target, max_unwind_cost=0.0,
+                 requote_interval=2.5):
+        """
+        Args:
+            hedges: Dict of instrument id -> id of the instrument hedging it, for every managed instrument.
+        """
+        self.risk = risk
+        self.market_data = market_data
+        self.gateway = gateway
+        self.quote_manager = quote_manager
+        self.hedges = hedges
+        self.unwind_target = unwind_target
+        self.max_unwind_cost = max_unwind_cost
+        self.requote_interval = requote_interval
+        # Positions held at start-up are checked on the first update
+        self.changed = set(hedges)
+        # Instrument id -> time its passive unwind quote is re-priced
+        self.requote_at = {}
+
+    def on_fill(self, trade):
+        if trade.instrument_id in self.hedges:
+            self.changed.add(trade.instrument_id)
+
+    def is_unwinding(self, instrument_id):
+        return instrument_id in self.requote_at
+
+    def update(self, now):
+        """
+        Unwind the instruments whose positions changed, and re-price unwind quotes that are due.
+
+        Args:
+            now: Current time on the trader's clock.
+
+        Returns:
+            List of futures for the messages sent.
+        """
+        futures = []
+        # In hedges order rather than set order, so backtests are reproducible
+        for instrument_id in self.hedges:
+            if instrument_id in self.changed or now >= self.requote_at.get(instrument_id, float('inf')):
+                futures.extend(self.unwind(instrument_id, now))
+        self.changed.clear()
+        return futures
+
+    def unwind(self, instrument_id, now):
+        position = self.risk.position_state.position(instrument_id)
+        excess = abs(position) - self.unwind_target
+        if excess <= 0 or (not self.is_unwinding(instrument_id) and self.risk.reduce_side(instrument_id) is None):
+            if self.is_unwinding(instrument_id):
+                logger.info('Position in %s unwound to %s, pulling unwind quote.', instrument_id, position)
+                del self.requote_at[instrument_id]
+                return self.quote_manager.update_quotes(instrument_id, {})
+            return []
+
+        side = 'ask' if position > 0 else 'bid'
+        book = self.market_data.mirror(instrument_id)
+
+        hedge_id = self.hedges[instrument_id]
+        hedge_side = OPPOSITE_SIDE[side]
+        hedge_position = self.risk.position_state.position(hedge_id)
+        hedge_book = self.market_data.mirror(hedge_id)
+        # The hedge offsets us if it is short while we are long, or the other way round
+        if hedge_position * position < 0 and (book.has_bids if side == 'ask' else book.has_asks) \
+                and (hedge_book.has_asks if hedge_side == 'bid' else hedge_book.has_bids):
+            price = book.best_bid if side == 'ask' else book.best_ask
+            hedge_price = hedge_book.best_ask if hedge_side == 'bid' else hedge_book.best_bid
+            cost = hedge_price - price if side == 'ask' else price - hedge_price
+            own_orders = self.risk.own_orders
+            if cost <= self.max_unwind_cost and not (own_orders.is_self_trade(instrument_id, side, price)
+                                                     or own_orders.is_self_trade(hedge_id, hedge_side, hedge_price)):
+                volume = int(min(excess, abs(hedge_position),
+                                 book.best_bid_volume if side == 'ask' else book.best_ask_volume,
+                                 hedge_book.best_ask_volume if hedge_side == 'bid' else hedge_book.best_bid_volume))
+                logger.info('Unwinding %s lot(s) of %s against %s at a cost of %.2f per lot.', volume, instrument_id, hedge_id, cost)
+                return self.gateway.submit_legs([
+                    Leg(instrument_id, price, volume, side, 'ioc'),
+                    Leg(hedge_id, hedge_price, volume, hedge_side, 'ioc')])
+
+        if not (book.has_asks if side == 'ask' else book.has_bids):
+            return []
+        price = book.best_ask if side == 'ask' else book.best_bid
+        volume = int(min(excess, book.best_ask_volume if side == 'ask' else book.best_bid_volume))
+        if self.risk.own_orders.is_self_trade(instrument_id, side, price):
+            return []
+        logger.info('Unwinding %s lot(s) of %s with a passive %s at %.2f.', volume, instrument_id, side, price)
+        self.requote_at[instrument_id] = now + self.requote_interval
+        # Replaces any strategy quotes on the instrument, the strategy leaves it alone while it is unwinding
+        return self.quote_manager.update_quotes(instrument_id, {side: (price, volume)})
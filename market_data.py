@@ -0,0 +1,73 @@
+import time
+
+from order_book import BookMirror
+
+
+class MarketDataEngine:
+    """
+    Change-detection poller over the top of book of a set of watched instruments.
+
+    Instead of sleeping for a fixed time between trade loop iterations, the
+    strategy blocks in wait_for_update() which returns as soon as the top of
+    book of any watched instrument changes. Every polled book is applied to a
+    local BookMirror, which the strategy reads its signals from without
+    another round-trip.
+    """
+
+    def __init__(self, exchange, instrument_ids, poll_interval=0.01, recorder=None):
+        self.exchange = exchange
+        self.instrument_ids = list(instrument_ids)
+        self.poll_interval = poll_interval
+        self.recorder = recorder
+        # perf_counter() time at which the last top-of-book change was seen, for tick-to-order latency
+        self.last_update_time = None
+        self.mirrors = {instrument_id: BookMirror(instrument_id) for instrument_id in self.instrument_ids}
+
+    def poll(self):
+        """
+        Fetch the book of every watched instrument once and apply it to its mirror.
+
+        Returns:
+            List of instrument ids whose top of book changed since the last poll.
+        """
+        changed = []
+        for instrument_id in self.instrument_ids:
+            if self.mirrors[instrument_id].update(self.exchange.get_last_price_book(instrument_id)):
+                changed.append(instrument_id)
+                self.last_update_time = time.perf_counter()
+                if self.recorder:
+                    self.recorder.record_top_of_book(instrument_id, self.mirrors[instrument_id])
+        return changed
+
+    def wait_for_update(self, timeout=None):
+        """
+        Block until the top of book of a watched instrument changes.
+
+        Args:
+            timeout: Maximum number of seconds to wait, or None to wait forever.
+
+        Returns:
+            Set of changed instrument ids, empty if the timeout expired first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = self.poll()
+            if changed:
+                return set(changed)
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            time.sleep(self.poll_interval)
+
+    def mirror(self, instrument_id):
+        """
+        Return the local book mirror of an instrument.
+
+        Watched instruments are served from the last poll. Any other instrument
+        is fetched from the exchange into a mirror of its own.
+        """
+        if instrument_id in self.instrument_ids:
+            return self.mirrors[instrument_id]
+        if instrument_id not in self.mirrors:
+            self.mirrors[instrument_id] = BookMirror(instrument_id)
+        self.mirrors[instrument_id].update(self.exchange.get_last_price_book(instrument_id))
+        return self.mirrors[instrument_id]
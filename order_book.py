@@ -0,0 +1,135 @@
+from array import array
+
+
+class BookMirror:
+    """
+    Local mirror of one instrument's order book.
+
+    Price levels are held in preallocated, array-backed buffers which are
+    overwritten in place on every update, so reading best bid/ask, depth at
+    a price or the microprice is O(1) and allocates nothing.
+    """
+
+    def __init__(self, instrument_id, max_depth=32):
+        self.instrument_id = instrument_id
+        self.max_depth = max_depth
+        self.bid_prices = array('d', bytes(8 * max_depth))
+        self.bid_volumes = array('d', bytes(8 * max_depth))
+        self.ask_prices = array('d', bytes(8 * max_depth))
+        self.ask_volumes = array('d', bytes(8 * max_depth))
+        self.n_bids = 0
+        self.n_asks = 0
+        self.timestamp = None
+        # price -> volume for every level currently in the book
+        self._bid_depth = {}
+        self._ask_depth = {}
+
+    def update(self, book):
+        """
+        Apply a price book snapshot from the exchange, touching only the levels that changed.
+
+        Returns:
+            True if the top of book (best price or volume on either side) changed, False otherwise.
+        """
+        old_bid, old_bid_volume = self.best_bid, self.best_bid_volume
+        old_ask, old_ask_volume = self.best_ask, self.best_ask_volume
+
+        self.n_bids = self._update_side(book.bids if book else (), self.bid_prices, self.bid_volumes, self.n_bids, self._bid_depth)
+        self.n_asks = self._update_side(book.asks if book else (), self.ask_prices, self.ask_volumes, self.n_asks, self._ask_depth)
+        if book:
+            self.timestamp = book.timestamp
+
+        return (old_bid != self.best_bid or old_bid_volume != self.best_bid_volume
+                or old_ask != self.best_ask or old_ask_volume != self.best_ask_volume)
+
+    def _update_side(self, levels, prices, volumes, n_old, depth):
+        n_new = min(len(levels), self.max_depth)
+        changed = n_new != n_old
+        for i in range(n_new):
+            level = levels[i]
+            if i < n_old and prices[i] == level.price and volumes[i] == level.volume:
+                continue
+            prices[i] = level.price
+            volumes[i] = level.volume
+            changed = True
+
+        # Re-index depth only when some level actually moved
+        if changed:
+            depth.clear()
+            for i in range(n_new):
+                depth[prices[i]] = volumes[i]
+        return n_new
+
+    @property
+    def has_bids(self):
+        return self.n_bids > 0
+
+    @property
+    def has_asks(self):
+        return self.n_asks > 0
+
+    @property
+    def best_bid(self):
+        return self.bid_prices[0] if self.n_bids else None
+
+    @property
+    def best_ask(self):
+        return self.ask_prices[0] if self.n_asks else None
+
+    @property
+    def best_bid_volume(self):
+        return self.bid_volumes[0] if self.n_bids else None
+
+    @property
+    def best_ask_volume(self):
+        return self.ask_volumes[0] if self.n_asks else None
+
+    def best_excluding(self, side, own_levels):
+        """
+        Best price on one side once our own resting volume is taken out of the book.
+
+        Args:
+            side: 'bid' or 'ask'.
+            own_levels: Dict of price -> our resting volume on that side, see OrderRegistry.levels().
+
+        Returns:
+            The best price with volume from other participants, None if there is none.
+        """
+        if side == 'bid':
+            prices, volumes, n = self.bid_prices, self.bid_volumes, self.n_bids
+        elif side == 'ask':
+            prices, volumes, n = self.ask_prices, self.ask_volumes, self.n_asks
+        else:
+            raise Exception(f'''Invalid side provided: {side}, expecting 'bid' or 'ask'.''')
+        for i in range(n):
+            if volumes[i] > own_levels.get(prices[i], 0):
+                return prices[i]
+        return None
+
+    def depth_at_price(self, side, price):
+        """
+        Volume resting at a given price.
+
+        Args:
+            side: 'bid' or 'ask'.
+            price: Price level to look up.
+
+        Returns:
+            Volume at that price, 0 if there is no such level.
+        """
+        if side == 'bid':
+            return self._bid_depth.get(price, 0)
+        elif side == 'ask':
+            return self._ask_depth.get(price, 0)
+        else:
+            raise Exception(f'''Invalid side provided: {side}, expecting 'bid' or 'ask'.''')
+
+    def microprice(self):
+        """
+        Volume-weighted mid of the top of book, None if either side is empty.
+        """
+        if not (self.n_bids and self.n_asks):
+            return None
+        bid_volume = self.bid_volumes[0]
+        ask_volume = self.ask_volumes[0]
+        return (self.bid_prices[0] * ask_volume + self.ask_prices[0] * bid_volume) / (bid_volume + ask_volume)
@@ -0,0 +1,86 @@
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+Leg = namedtuple('Leg', ['instrument_id', 'price', 'volume', 'side', 'order_type'])
+LegResult = namedtuple('LegResult', ['leg', 'response', 'latency'])
+
+
+class OrderGateway:
+    """
+    Dispatches order legs, amends and deletes to the exchange concurrently.
+
+    The optibook client is synchronous, so every leg is sent from a worker
+    thread. Both legs of an arbitrage leave at the same time instead of the
+    second one waiting a full round-trip for the first, and callers get
+    futures back for the acknowledgements. Acks are applied to the own-order
+    registry as they arrive.
+    """
+
+    def __init__(self, exchange, own_orders, max_workers=4, latency_history=1000):
+        self.exchange = exchange
+        self.own_orders = own_orders
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='order-gateway')
+        # Most recent per-leg round-trip latencies in seconds
+        self.leg_latencies = deque(maxlen=latency_history)
+
+    def submit_legs(self, legs):
+        """
+        Send several legs concurrently.
+
+        Args:
+            legs: Iterable of Leg tuples.
+
+        Returns:
+            List of futures resolving to a LegResult per leg, in the order the legs were given.
+        """
+        return [self.executor.submit(self._send_leg, leg) for leg in legs]
+
+    def submit_insert(self, instrument_id, price, volume, side, order_type):
+        return self.executor.submit(self._send_leg, Leg(instrument_id, price, volume, side, order_type))
+
+    def submit_amend(self, instrument_id, order_id, volume):
+        return self.executor.submit(self._send_amend, instrument_id, order_id, volume)
+
+    def submit_delete(self, instrument_id, order_id):
+        return self.executor.submit(self._send_delete, instrument_id, order_id)
+
+    def wait(self, futures):
+        """
+        Block until all futures are done.
+
+        Returns:
+            List of the futures' results in the same order: a LegResult for an inserted leg, and whether the
+            exchange accepted it (bool) for an amend or delete.
+        """
+        return [future.result() for future in futures]
+
+    def _send_leg(self, leg):
+        start = time.perf_counter()
+        response = self.exchange.insert_order(
+            instrument_id=leg.instrument_id,
+            price=leg.price,
+            volume=leg.volume,
+            side=leg.side,
+            order_type=leg.order_type)
+        latency = time.perf_counter() - start
+        self.leg_latencies.append(latency)
+
+        if response.success:
+            self.own_orders.on_insert(leg.instrument_id, response.order_id, leg.side, leg.price, leg.volume, leg.order_type)
+        return LegResult(leg, response, latency)
+
+    def _send_amend(self, instrument_id, order_id, volume):
+        success = self.exchange.amend_order(instrument_id, order_id=order_id, volume=volume)
+        if success:
+            self.own_orders.on_amend(instrument_id, order_id, volume)
+        return success
+
+    def _send_delete(self, instrument_id, order_id):
+        success = self.exchange.delete_order(instrument_id, order_id=order_id)
+        # A failed delete means the order is already gone (filled or cancelled)
+        self.own_orders.on_delete(instrument_id, order_id)
+        return success
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
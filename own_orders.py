@@ -0,0 +1,150 @@
+import threading
+
+
+class OrderRegistry:
+    """
+    Locally maintained index of our own resting orders.
+
+    Orders are indexed per instrument and side by price and kept in sync from
+    insert/amend/delete acknowledgements and our own fills, so checks such as
+    is_self_trade() need neither a network call nor a scan of the order list.
+    IOC orders never rest in the book and are therefore not tracked.
+    """
+
+    def __init__(self):
+        # instrument_id -> order_id -> [side, price, volume]
+        self._orders = {}
+        # (instrument_id, side) -> price -> total resting volume
+        self._levels = {}
+        # (instrument_id, side) -> best resting price, None if no orders
+        self._best = {}
+        # (instrument_id, side) -> total resting volume
+        self._side_volume = {}
+        self._lock = threading.Lock()
+
+    def sync(self, exchange, instrument_ids):
+        """
+        Rebuild the registry from the exchange's view of our outstanding orders.
+        """
+        for instrument_id in instrument_ids:
+            outstanding_orders = exchange.get_outstanding_orders(instrument_id)
+            with self._lock:
+                self._clear(instrument_id)
+                for order in outstanding_orders.values():
+                    self._add(instrument_id, order.order_id, order.side, order.price, order.volume)
+
+    def on_insert(self, instrument_id, order_id, side, price, volume, order_type='limit'):
+        if order_type == 'ioc':
+            return
+        with self._lock:
+            self._add(instrument_id, order_id, side, price, volume)
+
+    def on_amend(self, instrument_id, order_id, volume):
+        with self._lock:
+            order = self._orders.get(instrument_id, {}).get(order_id)
+            if order is None:
+                return
+            side, price, old_volume = order
+            self._remove(instrument_id, order_id)
+            if volume > 0:
+                self._add(instrument_id, order_id, side, price, volume)
+
+    def on_delete(self, instrument_id, order_id):
+        with self._lock:
+            self._remove(instrument_id, order_id)
+
+    def on_fill(self, trade):
+        """
+        Reduce the resting volume of one of our orders after it traded.
+        """
+        with self._lock:
+            order = self._orders.get(trade.instrument_id, {}).get(trade.order_id)
+            if order is None:
+                return
+            side, price, volume = order
+            self._remove(trade.instrument_id, trade.order_id)
+            if volume - trade.volume > 0:
+                self._add(trade.instrument_id, trade.order_id, side, price, volume - trade.volume)
+
+    def orders(self, instrument_id, side=None):
+        """
+        Returns:
+            Dict of order_id -> (side, price, volume) for our resting orders on the instrument. This is a
+            copy, so it can be iterated while gateway threads apply acks.
+        """
+        with self._lock:
+            return {order_id: tuple(order) for order_id, order in self._orders.get(instrument_id, {}).items()
+                    if side is None or order[0] == side}
+
+    def resting_volume(self, instrument_id, side):
+        """
+        Returns:
+            Total volume of our resting orders on one side of an instrument.
+        """
+        with self._lock:
+            return self._side_volume.get((instrument_id, side), 0)
+
+    def levels(self, instrument_id, side):
+        """
+        Returns:
+            Dict of price -> total volume of our resting orders on one side of an instrument (a copy).
+        """
+        with self._lock:
+            return dict(self._levels.get((instrument_id, side), ()))
+
+    def best_price(self, instrument_id, side):
+        """
+        Returns:
+            Our highest resting bid or lowest resting ask, None if we have no orders on that side.
+        """
+        with self._lock:
+            return self._best.get((instrument_id, side))
+
+    def is_self_trade(self, instrument_id, side, price):
+        """
+        Check if an incoming order at this price would trade against one of our own resting orders.
+        """
+        if side == 'bid':
+            best_own_ask = self._best.get((instrument_id, 'ask'))
+            return best_own_ask is not None and price >= best_own_ask
+        elif side == 'ask':
+            best_own_bid = self._best.get((instrument_id, 'bid'))
+            return best_own_bid is not None and price <= best_own_bid
+        else:
+            raise Exception(f'''Invalid side provided: {side}, expecting 'bid' or 'ask'.''')
+
+    def _add(self, instrument_id, order_id, side, price, volume):
+        self._orders.setdefault(instrument_id, {})[order_id] = [side, price, volume]
+        levels = self._levels.setdefault((instrument_id, side), {})
+        levels[price] = levels.get(price, 0) + volume
+        self._side_volume[(instrument_id, side)] = self._side_volume.get((instrument_id, side), 0) + volume
+
+        best = self._best.get((instrument_id, side))
+        if best is None or (side == 'bid' and price > best) or (side == 'ask' and price < best):
+            self._best[(instrument_id, side)] = price
+
+    def _remove(self, instrument_id, order_id):
+        order = self._orders.get(instrument_id, {}).pop(order_id, None)
+        if order is None:
+            return
+        side, price, volume = order
+        levels = self._levels[(instrument_id, side)]
+        levels[price] -= volume
+        self._side_volume[(instrument_id, side)] -= volume
+        if levels[price] <= 0:
+            del levels[price]
+            # Only removing the best level requires finding a new best price
+            if self._best.get((instrument_id, side)) == price:
+                if not levels:
+                    self._best[(instrument_id, side)] = None
+                elif side == 'bid':
+                    self._best[(instrument_id, side)] = max(levels)
+                else:
+                    self._best[(instrument_id, side)] = min(levels)
+
+    def _clear(self, instrument_id):
+        self._orders.pop(instrument_id, None)
+        for side in ('bid', 'ask'):
+            self._levels.pop((instrument_id, side), None)
+            self._best.pop((instrument_id, side), None)
+            self._side_volume.pop((instrument_id, side), None)
@@ -0,0 +1,89 @@
+import logging
+import threading
+
+logger = logging.getLogger('trading.positions')
+
+
+class PositionState:
+    """
+    Per-iteration snapshot of positions.
+
+    The snapshot is fetched from the exchange once per loop iteration with
+    refresh() and then kept up to date locally from our own fills, so risk
+    checks within an iteration need no further round-trip.
+
+    The local positions can be transiently wrong. A fill that lands between
+    draining the fills and the get_positions() reply is already in the
+    snapshot, and is applied a second time when it is drained later in the
+    same iteration. Trades carry no id to reconcile them against the
+    snapshot, so such an error lasts until the next refresh() replaces it.
+
+    Strategies sharing one PositionState each refresh and drain fills for
+    their own instruments only, so one strategy's refresh never overwrites
+    positions another strategy has updated from fills it has not drained yet.
+    """
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self.positions = {}
+        self._lock = threading.Lock()
+
+    def refresh(self, instrument_ids):
+        """
+        Fetch positions from the exchange and update those of the given instruments. Call once per loop iteration,
+        after draining the fills of the same instruments.
+
+        Returns:
+            The positions dict, which is updated in place and so stays current for the caller.
+        """
+        positions = self.exchange.get_positions()
+        with self._lock:
+            for instrument_id in instrument_ids:
+                self.positions[instrument_id] = positions.get(instrument_id, 0)
+        return self.positions
+
+    def position(self, instrument_id):
+        return self.positions.get(instrument_id, 0)
+
+    def apply_fill(self, instrument_id, side, volume):
+        """
+        Update the local position for one of our own fills.
+
+        Args:
+            instrument_id: The instrument that traded.
+            side: 'bid' if we bought, 'ask' if we sold.
+            volume: Traded volume.
+        """
+        if side == 'bid':
+            delta = volume
+        elif side == 'ask':
+            delta = -volume
+        else:
+            raise Exception(f'''Invalid side provided: {side}, expecting 'bid' or 'ask'.''')
+
+        with self._lock:
+            self.positions[instrument_id] = self.positions.get(instrument_id, 0) + delta
+
+    def poll_fills(self, instrument_ids):
+        """
+        Drain our new trades for the given instruments and apply them locally.
+
+        Returns:
+            List of trades that were applied.
+        """
+        applied = []
+        for instrument_id in instrument_ids:
+            for trade in self.exchange.poll_new_trades(instrument_id):
+                self.apply_fill(trade.instrument_id, trade.side, trade.volume)
+                applied.append(trade)
+        return applied
+
+    def log_positions_and_pnl(self, always_display=None):
+        # PnL is only needed here, so it is only fetched (and the filtered copy built) when debug logging is on
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        # Under the lock, another strategy's refresh() may be adding instruments to the shared dict
+        with self._lock:
+            positions = {instrument_id: position for instrument_id, position in self.positions.items()
+                         if not always_display or instrument_id in always_display or position != 0}
+        logger.debug('Positions: %s PnL: %s', positions, self.exchange.get_pnl())
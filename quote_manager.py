@@ -0,0 +1,73 @@
+class QuoteManager:
+    """
+    Moves our resting quotes towards a desired set with as few messages as possible.
+
+    Desired quotes are diffed against the resting orders in the own-order
+    registry. Quotes that already match are left alone so they keep their
+    queue priority, volume changes at an unchanged price are done with
+    amends or a top-up order, and only quotes whose price moved are
+    replaced. All resulting messages go out concurrently through the order
+    gateway.
+    """
+
+    def __init__(self, own_orders, gateway):
+        self.own_orders = own_orders
+        self.gateway = gateway
+        self.message_count = 0
+        self.unchanged_count = 0
+
+    def update_quotes(self, instrument_id, desired):
+        """
+        Move our quotes on one instrument to the desired state.
+
+        Args:
+            instrument_id: The instrument being quoted.
+            desired: Dict of side -> (price, volume). A side mapped to None, or not given, has all our
+                quotes on it pulled.
+
+        Returns:
+            List of futures for the messages sent, empty if the quotes were already as desired.
+        """
+        # Snapshot both sides before sending anything, the gateway threads apply acks to the registry as they arrive
+        resting_by_side = {side: self.own_orders.orders(instrument_id, side) for side in ('bid', 'ask')}
+        futures = []
+        for side in ('bid', 'ask'):
+            resting = resting_by_side[side]
+            quote = desired.get(side)
+
+            if quote is None:
+                for order_id in resting:
+                    futures.append(self.gateway.submit_delete(instrument_id, order_id))
+                continue
+
+            price, volume = quote
+            # Orders already resting at the desired price, oldest (best queue position) first
+            at_price = sorted(order_id for order_id, (_, order_price, _) in resting.items() if order_price == price)
+            for order_id in resting:
+                if order_id not in at_price:
+                    futures.append(self.gateway.submit_delete(instrument_id, order_id))
+
+            if not at_price:
+                futures.append(self.gateway.submit_insert(instrument_id, price=price, volume=volume, side=side, order_type='limit'))
+                continue
+
+            excess = sum(resting[order_id][2] for order_id in at_price) - volume
+            if excess == 0:
+                self.unchanged_count += 1
+            elif excess < 0:
+                # Top up with another order rather than giving up the resting orders' queue position
+                futures.append(self.gateway.submit_insert(instrument_id, price=price, volume=-excess, side=side, order_type='limit'))
+            else:
+                # Trim from the back of the queue
+                for order_id in reversed(at_price):
+                    if excess <= 0:
+                        break
+                    order_volume = resting[order_id][2]
+                    if order_volume <= excess:
+                        futures.append(self.gateway.submit_delete(instrument_id, order_id))
+                    else:
+                        futures.append(self.gateway.submit_amend(instrument_id, order_id, order_volume - excess))
+                    excess -= order_volume
+
+        self.message_count += len(futures)
+        return futures
@@ -0,0 +1,147 @@
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+TOP_OF_BOOK_DTYPE = np.dtype([
+    ('timestamp', 'f8'),
+    ('instrument', 'i4'),
+    ('bid_price', 'f8'),
+    ('bid_volume', 'f8'),
+    ('ask_price', 'f8'),
+    ('ask_volume', 'f8'),
+])
+
+FILL_DTYPE = np.dtype([
+    ('timestamp', 'f8'),
+    ('instrument', 'i4'),
+    ('order_id', 'i8'),
+    ('price', 'f8'),
+    ('volume', 'f8'),
+    ('side', 'i1'),  # 1 = we bought, -1 = we sold
+])
+
+TOP_OF_BOOK_FILE = 'top_of_book.bin'
+FILLS_FILE = 'fills.bin'
+INSTRUMENTS_FILE = 'instruments.json'
+
+
+class MarketDataRecorder:
+    """
+    Records every observed top of book and our own fills to fixed-width binary files.
+
+    The trading thread only pays for putting a tuple on a queue. A background
+    thread packs records into NumPy structured arrays and appends them to raw
+    record files in batches, which replay and analytics can memory-map with
+    load_top_of_book() and load_fills() without any parsing. Empty book sides
+    are recorded as NaN.
+    """
+
+    def __init__(self, directory, batch_size=1024, flush_interval=1.0):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self.instruments = load_instruments(directory)
+        self._codes = {instrument_id: code for code, instrument_id in enumerate(self.instruments)}
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._write_loop, name='market-data-recorder', daemon=True)
+        self._thread.start()
+
+    def record_top_of_book(self, instrument_id, book):
+        """
+        Queue the top of a BookMirror for writing.
+        """
+        self._queue.put((TOP_OF_BOOK_FILE, instrument_id, (
+            time.time(),
+            book.best_bid if book.has_bids else np.nan, book.best_bid_volume if book.has_bids else np.nan,
+            book.best_ask if book.has_asks else np.nan, book.best_ask_volume if book.has_asks else np.nan)))
+
+    def record_fill(self, trade):
+        """
+        Queue one of our own trades for writing.
+        """
+        self._queue.put((FILLS_FILE, trade.instrument_id, (
+            time.time(), trade.order_id or 0, trade.price, trade.volume, 1 if trade.side == 'bid' else -1)))
+
+    def close(self):
+        """
+        Write out everything queued so far and stop the writer thread.
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def _write_loop(self):
+        buffers = {
+            TOP_OF_BOOK_FILE: np.zeros(self.batch_size, dtype=TOP_OF_BOOK_DTYPE),
+            FILLS_FILE: np.zeros(self.batch_size, dtype=FILL_DTYPE),
+        }
+        counts = {TOP_OF_BOOK_FILE: 0, FILLS_FILE: 0}
+        last_flush = time.monotonic()
+        running = True
+        while running:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                running = False
+            elif item:
+                file_name, instrument_id, record = item
+                buffers[file_name][counts[file_name]] = (record[0], self._code(instrument_id)) + record[1:]
+                counts[file_name] += 1
+
+            if not running or any(count == self.batch_size for count in counts.values()) \
+                    or time.monotonic() - last_flush >= self.flush_interval:
+                for file_name, count in counts.items():
+                    if count:
+                        with open(os.path.join(self.directory, file_name), 'ab') as f:
+                            buffers[file_name][:count].tofile(f)
+                        counts[file_name] = 0
+                last_flush = time.monotonic()
+
+    def _code(self, instrument_id):
+        if instrument_id not in self._codes:
+            self._codes[instrument_id] = len(self.instruments)
+            self.instruments.append(instrument_id)
+            with open(os.path.join(self.directory, INSTRUMENTS_FILE), 'w') as f:
+                json.dump(self.instruments, f)
+        return self._codes[instrument_id]
+
+
+def load_instruments(directory):
+    """
+    Returns:
+        List of instrument ids, indexed by the instrument codes used in the record files.
+    """
+    path = os.path.join(directory, INSTRUMENTS_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_top_of_book(directory):
+    """
+    Memory-map the recorded top-of-book records of a recording directory.
+    """
+    return _memmap(os.path.join(directory, TOP_OF_BOOK_FILE), TOP_OF_BOOK_DTYPE)
+
+
+def load_fills(directory):
+    """
+    Memory-map the recorded fill records of a recording directory.
+    """
+    return _memmap(os.path.join(directory, FILLS_FILE), FILL_DTYPE)
+
+
+def _memmap(path, dtype):
+    # Ignore a trailing partial record left by a process killed mid-write
+    n_records = os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+    if n_records == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(n_records,))
@@ -0,0 +1,106 @@
+class RiskEngine:
+    """
+    Pre-trade risk checks shared by all strategies.
+
+    Every check reads the in-memory position snapshot and own-order registry,
+    so it runs in constant time without calling the exchange. Outstanding
+    order volume counts towards the limits: a resting bid could still fill
+    and push the position up. Rather than rejecting an order that would
+    breach a limit, the engine scales its volume down to what still fits.
+    """
+
+    def __init__(self, position_state, own_orders, position_limit=100, reduce_threshold=94, pair_limit=None,
+                 hedge_ratios=None):
+        """
+        Args:
+            hedge_ratios: Dict of (instrument id, hedge id) -> price of the instrument per unit of the hedge's price,
+                so one hedge lot offsets 1 / ratio lots of the instrument. The pair's exposure and limit are in lots
+                of the instrument. Pairs not listed are hedged lot for lot.
+        """
+        self.position_state = position_state
+        self.own_orders = own_orders
+        self.position_limit = position_limit
+        # Positions at or beyond this are actively reduced
+        self.reduce_threshold = reduce_threshold
+        # Maximum absolute net position across the two legs of a pair, None for no pair limit
+        self.pair_limit = pair_limit
+        self.hedge_ratios = hedge_ratios or {}
+
+    def headroom(self, instrument_id, side, include_resting=True):
+        """
+        Volume that can still be traded on one side without possibly breaching the position limit.
+
+        Args:
+            instrument_id: The instrument to trade.
+            side: 'bid' or 'ask'.
+            include_resting: Count our resting orders on the same side as if they could still fill. Pass
+                False for a quote that will replace those orders.
+        """
+        position = self.position_state.position(instrument_id)
+        resting = self.own_orders.resting_volume(instrument_id, side) if include_resting else 0
+        if side == 'bid':
+            return max(0, self.position_limit - (position + resting))
+        elif side == 'ask':
+            return max(0, self.position_limit + (position - resting))
+        else:
+            raise Exception(f'''Invalid side provided: {side}, expecting 'bid' or 'ask'.''')
+
+    def scale_volume(self, instrument_id, side, volume, include_resting=True):
+        return min(volume, self.headroom(instrument_id, side, include_resting))
+
+    def pair_weights(self, instrument_id, hedge_id):
+        """
+        Returns:
+            Tuple (weight of a lot of instrument_id, weight of a lot of hedge_id) in the pair's exposure.
+        """
+        if (instrument_id, hedge_id) in self.hedge_ratios:
+            return 1.0, 1 / self.hedge_ratios[(instrument_id, hedge_id)]
+        elif (hedge_id, instrument_id) in self.hedge_ratios:
+            return 1 / self.hedge_ratios[(hedge_id, instrument_id)], 1.0
+        return 1.0, 1.0
+
+    def pair_exposure(self, instrument_id, hedge_id):
+        """
+        Net position across the two legs of a hedged pair, each leg weighted by its hedge ratio.
+        """
+        weight, hedge_weight = self.pair_weights(instrument_id, hedge_id)
+        return weight * self.position_state.position(instrument_id) + hedge_weight * self.position_state.position(hedge_id)
+
+    def scale_pair(self, instrument_id, side, volume, hedge_id, hedge_side, hedge_volume, include_resting=True):
+        """
+        Scale both legs of a hedged trade to what fits within the instrument and pair limits.
+
+        Returns:
+            Tuple (volume, hedge_volume). Both are 0 if either leg has no room at all, so we never trade one
+            leg without its hedge.
+        """
+        volume = self.scale_volume(instrument_id, side, volume, include_resting)
+        hedge_volume = self.scale_volume(hedge_id, hedge_side, hedge_volume, include_resting)
+        if volume == 0 or hedge_volume == 0:
+            return 0, 0
+
+        if self.pair_limit is not None:
+            weight, hedge_weight = self.pair_weights(instrument_id, hedge_id)
+            net_change = weight * (volume if side == 'bid' else -volume) + hedge_weight * (hedge_volume if hedge_side == 'bid' else -hedge_volume)
+            net = self.pair_exposure(instrument_id, hedge_id)
+            if abs(net + net_change) > self.pair_limit and abs(net + net_change) > abs(net):
+                # Trade the legs in the hedge ratio (to the nearest lot) so the pair's net position does not grow
+                if weight * volume > hedge_weight * hedge_volume:
+                    volume = round(hedge_weight * hedge_volume / weight)
+                else:
+                    hedge_volume = round(weight * volume / hedge_weight)
+                if volume == 0 or hedge_volume == 0:
+                    return 0, 0
+        return volume, hedge_volume
+
+    def reduce_side(self, instrument_id):
+        """
+        Returns:
+            'ask' if a long position has reached the reduce threshold, 'bid' for a short one, None otherwise.
+        """
+        position = self.position_state.position(instrument_id)
+        if position >= self.reduce_threshold:
+            return 'ask'
+        elif position <= -self.reduce_threshold:
+            return 'bid'
+        return None
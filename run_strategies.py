@@ -0,0 +1,54 @@
+import asyncio
+import logging
+
+from optibook.synchronous_client import Exchange
+
+from dual_listing_algo import DualListingTrader
+from etf_futures_algo import EtfFuturesTrader
+from event_log import setup_logging
+from instrumentation import Instrumentation, InstrumentedExchange
+from position_state import PositionState
+from recorder import MarketDataRecorder
+
+
+async def run_trader(trader):
+    """
+    Run one strategy as an independent coroutine.
+
+    The optibook client is synchronous, so both the wait for a market update
+    and the trade iteration itself run in worker threads. A blocking call in
+    one strategy therefore never stalls the other, and each strategy keeps its
+    own cadence (wake timeout, poll interval, re-quote cooldowns).
+    """
+    while True:
+        timer = trader.instrumentation.timer(trader.stage_prefix)
+        changed_instruments = await asyncio.to_thread(trader.market_data.wait_for_update, trader.wake_timeout)
+        timer.mark('wait_for_update')
+        await asyncio.to_thread(trader.trade_iteration, changed_instruments)
+        timer.mark('trade_iteration')
+
+
+async def main():
+    instrumentation = Instrumentation()
+    instrumentation.install('instrumentation.json')
+    exchange = InstrumentedExchange(Exchange(), instrumentation)
+    exchange.connect()
+
+    logging.getLogger('client').setLevel('ERROR')
+    setup_logging('INFO')
+
+    # Both strategies share one exchange connection and one position cache
+    position_state = PositionState(exchange)
+    recorder = MarketDataRecorder('recordings')
+    traders = [
+        DualListingTrader(exchange, position_state, recorder=recorder, instrumentation=instrumentation),
+        EtfFuturesTrader(exchange, position_state, recorder=recorder, instrumentation=instrumentation),
+    ]
+    try:
+        await asyncio.gather(*(run_trader(trader) for trader in traders))
+    finally:
+        recorder.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+import numpy as np
+
+STRAT_NONE = 0
+STRAT_ACTIVE = 1
+STRAT_PASSIVE = 2
+
+BID = 1
+ASK = -1
+
+
+def dual_listing_signals(pri_bid, pri_ask, sec_bid, sec_ask, price_improvement=0.01):
+    """
+    Decide the arbitrage for N dual listed pairs in one pass.
+
+    Args:
+        pri_bid, pri_ask, sec_bid, sec_ask: Arrays of best prices for the primary and secondary
+            listings, NaN where a book side is empty. Our own resting quotes should be excluded, so that a
+            passive quote is priced off other participants' orders rather than stepping over itself.
+        price_improvement: Amount passive quotes improve on the best price.
+
+    Returns:
+        Tuple of arrays (strat, pri_side, pri_price, sec_price). strat is STRAT_NONE, STRAT_ACTIVE or
+        STRAT_PASSIVE, pri_side is BID or ASK for the primary listing (the secondary leg always takes
+        the opposite side).
+    """
+    # Pairs with an empty book side are never traded
+    valid = ~(np.isnan(pri_bid) | np.isnan(pri_ask) | np.isnan(sec_bid) | np.isnan(sec_ask))
+    # Same precedence as the scalar if/elif chain: active crosses first, then passive quoting
+    conditions = [
+        valid & (sec_bid > pri_ask),  # active: buy primary, sell secondary
+        valid & (pri_bid > sec_ask),  # active: sell primary, buy secondary
+        valid & (pri_ask > sec_ask),  # passive: quote ask on primary, bid on secondary
+        valid & (sec_ask > pri_ask),  # passive: quote bid on primary, ask on secondary
+    ]
+    strat = np.select(conditions, [STRAT_ACTIVE, STRAT_ACTIVE, STRAT_PASSIVE, STRAT_PASSIVE], STRAT_NONE)
+    pri_side = np.select(conditions, [BID, ASK, ASK, BID], 0)
+    # Rounded back onto the 0.01 tick grid, so a re-quote at the same level compares equal to the resting quote
+    pri_price = np.round(np.select(conditions, [pri_ask, pri_bid, pri_ask - price_improvement, pri_bid + price_improvement], np.nan), 2)
+    sec_price = np.round(np.select(conditions, [sec_bid, sec_ask, sec_bid + price_improvement, sec_ask - price_improvement], np.nan), 2)
+    return strat, pri_side, pri_price, sec_price
+
+
+def leg_volume(position, side, base_volume, extra_volume):
+    """
+    Volume to trade on one leg: the base volume, plus the extra volume when the trade does not add to
+    an existing position in that direction.
+    """
+    if (position >= 0 and side == 'ask') or (position <= 0 and side == 'bid'):
+        return base_volume + extra_volume
+    return base_volume
+
+
+def etf_fair_value(fut_bid, fut_ask, discount_factor, ratio=0.25, offset=2.5, tick=0.01):
+    """
+    ETF fair bid/ask implied by the futures top of book, widened by one tick on each side.
+    """
+    etf_fair_bid = np.round(fut_bid * discount_factor * ratio + offset - tick, 2)
+    etf_fair_ask = np.round(fut_ask * discount_factor * ratio + offset + tick, 2)
+    return etf_fair_bid, etf_fair_ask
+
+
+def etf_futures_signals(etf_bid, etf_ask, etf_fair_bid, etf_fair_ask, fut_bid, fut_ask, price_improvement=0.01):
+    """
+    Decide the ETF vs futures arbitrage for N ETF/future pairs in one pass.
+
+    Args:
+        etf_bid, etf_ask, fut_bid, fut_ask: Arrays of best prices excluding our own quotes, NaN where a book
+            side is empty.
+        etf_fair_bid, etf_fair_ask: Arrays of ETF fair values implied by the futures.
+        price_improvement: Amount passive quotes improve on the best price.
+
+    Returns:
+        Tuple of arrays (strat, etf_side, etf_price, fut_price), as for dual_listing_signals() with
+        the ETF as the primary leg.
+    """
+    valid = ~(np.isnan(etf_bid) | np.isnan(etf_ask) | np.isnan(fut_bid) | np.isnan(fut_ask))
+    conditions = [
+        valid & (etf_fair_bid > etf_ask),  # active: ETF is cheap, buy ETF, sell futures at bid
+        valid & (etf_fair_ask < etf_bid),  # active: ETF is expensive, sell ETF, buy futures at ask
+        valid & (etf_ask > etf_fair_ask),  # passive: quote ask on ETF, bid on futures
+        valid & (etf_fair_ask > etf_ask),  # passive: quote bid on ETF, ask on futures
+    ]
+    strat = np.select(conditions, [STRAT_ACTIVE, STRAT_ACTIVE, STRAT_PASSIVE, STRAT_PASSIVE], STRAT_NONE)
+    etf_side = np.select(conditions, [BID, ASK, ASK, BID], 0)
+    etf_price = np.round(np.select(conditions, [etf_ask, etf_bid, etf_ask - price_improvement, etf_ask], np.nan), 2)
+    fut_price = np.round(np.select(conditions, [fut_bid, fut_ask, fut_ask, fut_ask - price_improvement], np.nan), 2)
+    return strat, etf_side, etf_price, fut_price
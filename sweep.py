@@ -0,0 +1,119 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from backtest import SimulatedExchange, load_feed, run_backtest, synthetic_dual_listing_feed, synthetic_etf_futures_feed
+from dual_listing_algo import DualListingParams, DualListingTrader, stock_pair_list
+from etf_futures_algo import EtfFuturesParams, EtfFuturesTrader
+from position_state import PositionState
+
+STRATEGIES = {
+    'dual_listing': (DualListingTrader, DualListingParams),
+    'etf_futures': (EtfFuturesTrader, EtfFuturesParams),
+}
+
+# Set once per worker process by _init_worker, so the feed is pickled once per worker instead of once per configuration
+_feed = None
+
+
+def parameter_grid(params_type, **values):
+    """
+    Every combination of the given parameter values, with defaults for the parameters not given.
+
+    Example:
+        parameter_grid(DualListingParams, active_extra_volume=[16, 26], price_improvement=[0.01, 0.02])
+
+    Returns:
+        List of params_type instances.
+    """
+    names = list(values)
+    return [params_type()._replace(**dict(zip(names, combination))) for combination in itertools.product(*values.values())]
+
+
+def evaluate(strategy, params, feed):
+    """
+    Backtest one parameter configuration of a strategy over a feed.
+
+    Returns:
+        Dict of the parameters, PnL, fill ratio (traded over submitted volume) and inventory statistics.
+    """
+    trader_type, _ = STRATEGIES[strategy]
+    exchange = SimulatedExchange(feed)
+    result = run_backtest(trader_type(exchange, PositionState(exchange), params=params), exchange)
+    return {
+        'params': params._asdict(),
+        'pnl': result.pnl,
+        'trade_count': result.trade_count,
+        'traded_volume': result.traded_volume,
+        'fill_ratio': result.traded_volume / result.submitted_volume if result.submitted_volume else 0.0,
+        'message_count': result.message_count,
+        'final_positions': result.positions,
+        'max_abs_position': max(result.max_abs_position.values(), default=0),
+        'mean_abs_position': sum(result.mean_abs_position.values()) / len(result.mean_abs_position) if result.mean_abs_position else 0.0,
+    }
+
+
+def _init_worker(feed):
+    global _feed
+    _feed = feed
+    # Without a configured handler, warnings such as position reductions would go to stderr from every worker
+    logging.getLogger('trading').setLevel('ERROR')
+
+
+def _evaluate_in_worker(strategy, params):
+    return evaluate(strategy, params, _feed)
+
+
+def run_sweep(strategy, grid, feed, max_workers=None):
+    """
+    Evaluate every configuration in the grid in parallel, one backtest per process.
+
+    Args:
+        strategy: 'dual_listing' or 'etf_futures'.
+        grid: Iterable of the strategy's params (see parameter_grid()).
+        feed: Snapshots to replay, shared by every configuration.
+        max_workers: Number of processes, all cores by default.
+
+    Returns:
+        List of evaluate() results, in grid order.
+    """
+    grid = list(grid)
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), initializer=_init_worker, initargs=(feed,)) as pool:
+        return list(pool.map(_evaluate_in_worker, itertools.repeat(strategy, len(grid)), grid))
+
+
+def print_results(results):
+    print(f'{"pnl":>10s} {"fill ratio":>10s} {"max |pos|":>9s} {"mean |pos|":>10s} {"messages":>8s}  params')
+    for result in sorted(results, key=lambda result: result['pnl'], reverse=True):
+        params = ', '.join(f'{name}={value}' for name, value in result['params'].items())
+        print(f'''{result['pnl']:10.2f} {result['fill_ratio']:10.3f} {result['max_abs_position']:9d} {result['mean_abs_position']:10.2f} {result['message_count']:8d}  {params}''')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backtest a grid of strategy parameters in parallel.')
+    parser.add_argument('strategy', choices=sorted(STRATEGIES))
+    parser.add_argument('--recording', help='Directory written by recorder.MarketDataRecorder, synthetic books if omitted')
+    parser.add_argument('--steps', type=int, default=2000, help='Number of synthetic book updates')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--output', help='Also save the results as JSON to this path')
+    args = parser.parse_args()
+
+    if args.recording:
+        feed = load_feed(args.recording)
+    elif args.strategy == 'dual_listing':
+        feed = synthetic_dual_listing_feed(stock_pair_list, n_steps=args.steps, seed=args.seed)
+    else:
+        feed = synthetic_etf_futures_feed('OB5X_ETF', 'OB5X_202509_F', n_steps=args.steps, seed=args.seed)
+
+    _, params_type = STRATEGIES[args.strategy]
+    grid = parameter_grid(params_type, active_extra_volume=[6, 16, 26], passive_extra_volume=[6, 16, 26],
+                          price_improvement=[0.01, 0.02, 0.05])
+    results = run_sweep(args.strategy, grid, feed, args.workers)
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
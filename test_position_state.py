@@ -0,0 +1,38 @@
+from collections import namedtuple
+
+from position_state import PositionState
+
+Trade = namedtuple('Trade', ['instrument_id', 'price', 'volume', 'side'])
+
+
+class FilledExchange:
+    """
+    Exchange whose positions already include fills that have not been polled yet.
+    """
+
+    def __init__(self, positions, trades):
+        self.positions = positions
+        self.trades = trades
+
+    def get_positions(self):
+        return dict(self.positions)
+
+    def poll_new_trades(self, instrument_id):
+        trades = [trade for trade in self.trades if trade.instrument_id == instrument_id]
+        self.trades = [trade for trade in self.trades if trade.instrument_id != instrument_id]
+        return trades
+
+
+def test_refresh_leaves_other_strategies_instruments_alone():
+    exchange = FilledExchange({'A': 0, 'B': 5}, [])
+    position_state = PositionState(exchange)
+    positions = position_state.refresh(['A', 'B'])
+    exchange.positions['B'] = 10
+    exchange.trades.append(Trade('B', 100.0, 5, 'bid'))
+
+    # Another strategy refreshes its own instrument while the fill on B is still waiting to be polled
+    position_state.refresh(['A'])
+    position_state.poll_fills(['B'])
+    assert position_state.position('B') == 10
+    assert position_state.refresh(['B']) is positions
+    assert positions == {'A': 0, 'B': 10}
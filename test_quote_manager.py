@@ -0,0 +1,56 @@
+from backtest import SimulatedExchange, Snapshot
+from dual_listing_algo import DualListingTrader
+from order_gateway import OrderGateway
+from own_orders import OrderRegistry
+from position_state import PositionState
+from quote_manager import QuoteManager
+
+# Overlapping spreads with the primary ask above the secondary ask: the dual listing strategy quotes passively
+PRI_BOOK = ([(99.5, 10)], [(101.0, 10)])
+SEC_BOOK = ([(99.0, 10)], [(100.5, 10)])
+
+
+def unchanged_market(n_steps):
+    return [Snapshot(float(step), instrument_id, *book)
+            for step in range(n_steps) for instrument_id, book in (('A', PRI_BOOK), ('A_DUAL', SEC_BOOK))]
+
+
+def test_update_quotes_leaves_matching_quotes_alone():
+    exchange = SimulatedExchange(unchanged_market(1))
+    exchange.step()
+    own_orders = OrderRegistry()
+    gateway = OrderGateway(exchange, own_orders)
+    quote_manager = QuoteManager(own_orders, gateway)
+    try:
+        gateway.wait(quote_manager.update_quotes('A', {'ask': (100.99, 5)}))
+        messages = exchange.message_count
+
+        assert quote_manager.update_quotes('A', {'ask': (100.99, 5)}) == []
+        assert exchange.message_count == messages
+        assert quote_manager.unchanged_count == 1
+    finally:
+        gateway.shutdown()
+
+
+def test_requote_on_unchanged_market_sends_no_messages():
+    exchange = SimulatedExchange(unchanged_market(2))
+    exchange.step()
+    trader = DualListingTrader(exchange, PositionState(exchange), stock_pair_list=[('A', 'A_DUAL')])
+    try:
+        now = 0.0
+        trader.clock = lambda: now
+        trader.market_data.poll()
+        trader.trade_iteration({'A', 'A_DUAL'})
+        assert trader.own_orders.orders('A', 'ask') and trader.own_orders.orders('A_DUAL', 'bid')
+        messages = exchange.message_count
+
+        # Our own quotes are now the best prices in both books. Re-quoting after the cooldown must price
+        # off the other participants' orders again, which have not moved, and so keep the resting quotes.
+        exchange.step()
+        trader.market_data.poll()
+        now = trader.params.passive_requote_interval + 1
+        trader.trade_iteration({'A', 'A_DUAL'})
+        assert exchange.message_count == messages
+        assert trader.quote_manager.unchanged_count == 2
+    finally:
+        trader.gateway.shutdown()
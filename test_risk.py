@@ -0,0 +1,42 @@
+import pytest
+
+from own_orders import OrderRegistry
+from risk import RiskEngine
+
+
+class FixedPositions:
+    def __init__(self, positions):
+        self.positions = positions
+
+    def position(self, instrument_id):
+        return self.positions.get(instrument_id, 0)
+
+
+def etf_futures_risk(positions):
+    return RiskEngine(FixedPositions(positions), OrderRegistry(), pair_limit=40, hedge_ratios={('ETF', 'FUT'): 0.25})
+
+
+def test_pair_exposure_weights_the_hedge_leg():
+    risk = etf_futures_risk({'ETF': 8, 'FUT': -2})
+    assert risk.pair_exposure('ETF', 'FUT') == 0
+    assert risk.pair_exposure('FUT', 'ETF') == 0
+    # Counted in ETF lots whichever leg comes first
+    assert etf_futures_risk({'FUT': 1}).pair_exposure('FUT', 'ETF') == 4
+    assert RiskEngine(FixedPositions({'A': 8, 'B': -2}), OrderRegistry()).pair_exposure('A', 'B') == 6
+
+
+def test_scale_pair_trades_the_legs_in_the_hedge_ratio_at_the_pair_limit():
+    risk = etf_futures_risk({})
+    # Lot for lot, selling 20 futures against 20 ETF would leave us short 60 ETF lots
+    assert risk.scale_pair('ETF', 'bid', 20, 'FUT', 'ask', 20) == (20, 5)
+    assert risk.scale_pair('FUT', 'ask', 20, 'ETF', 'bid', 20) == (5, 20)
+
+
+def test_scale_pair_leaves_hedged_trades_alone():
+    assert etf_futures_risk({}).scale_pair('ETF', 'bid', 20, 'FUT', 'ask', 5) == (20, 5)
+
+
+@pytest.mark.parametrize('volume', [1, 2])
+def test_scale_pair_does_not_trade_one_leg_alone(volume):
+    # Less than one futures lot hedges the ETF volume
+    assert etf_futures_risk({'ETF': -40}).scale_pair('ETF', 'bid', volume, 'FUT', 'ask', 1) == (0, 0)
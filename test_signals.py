@@ -0,0 +1,121 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from signals import ASK, BID, STRAT_ACTIVE, STRAT_NONE, STRAT_PASSIVE, dual_listing_signals, etf_futures_signals
+
+NAN = float('nan')
+STRATS = {'active': STRAT_ACTIVE, 'passive': STRAT_PASSIVE, 'do nothing': STRAT_NONE}
+
+
+def scalar_dual_listing(pri_bid, pri_ask, sec_bid, sec_ask):
+    """
+    The per-pair if/elif chain the vectorized kernel replaced.
+    """
+    if any(math.isnan(price) for price in (pri_bid, pri_ask, sec_bid, sec_ask)):
+        return 'do nothing', None, None, None
+    if sec_bid > pri_ask:
+        return 'active', 'bid', pri_ask, sec_bid
+    elif pri_bid > sec_ask:
+        return 'active', 'ask', pri_bid, sec_ask
+    elif pri_ask > sec_ask:
+        return 'passive', 'ask', pri_ask - 0.01, sec_bid + 0.01
+    elif sec_ask > pri_ask:
+        return 'passive', 'bid', pri_bid + 0.01, sec_ask - 0.01
+    else:
+        return 'do nothing', None, None, None
+
+
+def scalar_etf_futures(etf_bid, etf_ask, etf_fair_bid, etf_fair_ask, fut_bid, fut_ask):
+    """
+    The if/elif chain the vectorized kernel replaced, including its passive quirks (ETF bid at the ETF ask,
+    futures bid at the futures ask).
+    """
+    if any(math.isnan(price) for price in (etf_bid, etf_ask, fut_bid, fut_ask)):
+        return 'do nothing', None, None, None
+    if etf_fair_bid > etf_ask:
+        return 'active', 'bid', etf_ask, fut_bid
+    elif etf_fair_ask < etf_bid:
+        return 'active', 'ask', etf_bid, fut_ask
+    elif etf_ask > etf_fair_ask:
+        return 'passive', 'ask', etf_ask - 0.01, fut_ask
+    elif etf_fair_ask > etf_ask:
+        return 'passive', 'bid', etf_ask, fut_ask - 0.01
+    else:
+        return 'do nothing', None, None, None
+
+
+def assert_matches(expected, strat, side, price, hedge_price):
+    expected_strat, expected_side, expected_price, expected_hedge_price = expected
+    assert strat == STRATS[expected_strat]
+    if expected_strat == 'do nothing':
+        assert side == 0 and np.isnan(price) and np.isnan(hedge_price)
+    else:
+        assert side == (BID if expected_side == 'bid' else ASK)
+        assert price == pytest.approx(expected_price)
+        assert hedge_price == pytest.approx(expected_hedge_price)
+
+
+@pytest.mark.parametrize('pri_bid, pri_ask, sec_bid, sec_ask', [
+    (99.0, 100.0, 101.0, 102.0),   # buy primary, sell secondary
+    (101.0, 102.0, 99.0, 100.0),   # sell primary, buy secondary
+    (103.0, 100.0, 101.0, 99.0),   # both active conditions hold, the first one wins
+    (99.0, 100.0, 100.0, 101.0),   # secondary bid equals primary ask: not active, passive bid
+    (100.0, 101.0, 99.0, 100.0),   # primary bid equals secondary ask: not active, passive ask
+    (99.5, 101.0, 99.0, 100.5),    # overlapping spreads, primary ask higher: passive ask
+    (99.0, 100.5, 99.5, 101.0),    # overlapping spreads, secondary ask higher: passive bid
+    (100.0, 100.5, 100.0, 100.5),  # identical books: do nothing
+    (NAN, 100.0, 101.0, 102.0),
+    (99.0, NAN, 101.0, 102.0),
+    (99.0, 100.0, NAN, 102.0),
+    (99.0, 100.0, 101.0, NAN),
+])
+def test_dual_listing_signals_match_scalar_chain(pri_bid, pri_ask, sec_bid, sec_ask):
+    strat, side, price, hedge_price = dual_listing_signals(
+        np.array([pri_bid]), np.array([pri_ask]), np.array([sec_bid]), np.array([sec_ask]))
+    assert_matches(scalar_dual_listing(pri_bid, pri_ask, sec_bid, sec_ask), strat[0], side[0], price[0], hedge_price[0])
+
+
+@pytest.mark.parametrize('etf_bid, etf_ask, etf_fair_bid, etf_fair_ask, fut_bid, fut_ask', [
+    (99.0, 100.0, 100.5, 101.0, 390.0, 391.0),   # ETF cheap: buy ETF, sell futures
+    (101.0, 102.0, 99.5, 100.0, 390.0, 391.0),   # ETF expensive: sell ETF, buy futures
+    (101.0, 100.0, 100.5, 100.5, 390.0, 391.0),  # both active conditions hold, the first one wins
+    (99.0, 100.0, 100.0, 100.5, 390.0, 391.0),   # fair bid equals ETF ask: not active, passive bid
+    (100.5, 101.0, 99.5, 100.5, 390.0, 391.0),   # fair ask equals ETF bid: not active, passive ask
+    (99.0, 101.0, 99.5, 100.5, 390.0, 391.0),    # ETF ask above fair ask: passive ask
+    (99.0, 100.0, 99.5, 100.0, 390.0, 391.0),    # ETF ask equals fair ask: do nothing
+    (NAN, 100.0, 100.5, 101.0, 390.0, 391.0),
+    (99.0, NAN, 100.5, 101.0, 390.0, 391.0),
+    (99.0, 100.0, 100.5, 101.0, NAN, 391.0),
+    (99.0, 100.0, 100.5, 101.0, 390.0, NAN),
+])
+def test_etf_futures_signals_match_scalar_chain(etf_bid, etf_ask, etf_fair_bid, etf_fair_ask, fut_bid, fut_ask):
+    strat, side, price, hedge_price = etf_futures_signals(
+        *(np.array([value]) for value in (etf_bid, etf_ask, etf_fair_bid, etf_fair_ask, fut_bid, fut_ask)))
+    assert_matches(scalar_etf_futures(etf_bid, etf_ask, etf_fair_bid, etf_fair_ask, fut_bid, fut_ask),
+                   strat[0], side[0], price[0], hedge_price[0])
+
+
+def random_prices(rng, n, low, high, nan_rate=0.05):
+    # Prices on a coarse tick grid, so ties between books are common
+    return np.array([NAN if rng.random() < nan_rate else round(rng.randint(low, high) * 0.1, 2) for _ in range(n)])
+
+
+def test_dual_listing_signals_match_scalar_chain_on_random_books():
+    rng = random.Random(0)
+    tops = [random_prices(rng, 2000, 995, 1005) for _ in range(4)]
+    strat, side, price, hedge_price = dual_listing_signals(*tops)
+    for i in range(len(strat)):
+        assert_matches(scalar_dual_listing(*(float(top[i]) for top in tops)), strat[i], side[i], price[i], hedge_price[i])
+
+
+def test_etf_futures_signals_match_scalar_chain_on_random_books():
+    rng = random.Random(0)
+    etf_bid, etf_ask, etf_fair_bid, etf_fair_ask = (random_prices(rng, 2000, 995, 1005) for _ in range(4))
+    fut_bid, fut_ask = (random_prices(rng, 2000, 3900, 3910) for _ in range(2))
+    inputs = (etf_bid, etf_ask, etf_fair_bid, etf_fair_ask, fut_bid, fut_ask)
+    strat, side, price, hedge_price = etf_futures_signals(*inputs)
+    for i in range(len(strat)):
+        assert_matches(scalar_etf_futures(*(float(values[i]) for values in inputs)), strat[i], side[i], price[i], hedge_price[i])